@@ -0,0 +1,164 @@
+"""
+ASGI entry point of the backend, run with: python asgi.py (or uvicorn asgi:app)
+
+Async views of main.py are awaited directly on the server's event loop, so their LLM, Semantic Scholar
+and PDF requests share the loop's connection pools and many of them can be in flight in one process
+without a thread each. All other routes run as plain WSGI on a bounded pool of ASGI_SYNC_WORKERS threads.
+"""
+import asyncio
+import contextvars
+import inspect
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+import llm
+from main import app as flask_app
+
+SYNC_WORKERS = int(os.getenv("ASGI_SYNC_WORKERS", "32"))
+sync_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="wsgi")
+
+
+def build_environ(scope, body):
+    '''
+    WSGI environ of an ASGI http scope
+    '''
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def async_view(environ):
+    '''
+    The coroutine view function the request is routed to, None for sync views, unmatched requests
+    and CORS preflight requests, which are answered by the WSGI app
+    '''
+    if environ["REQUEST_METHOD"] == "OPTIONS":
+        return None
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    view = flask_app.view_functions.get(endpoint)
+    return view if inspect.iscoroutinefunction(view) else None
+
+
+async def dispatch_async(view, environ):
+    '''
+    Run an async view on the current event loop with the same request hooks and error handling as Flask
+    '''
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = await view(**request.view_args)
+        except Exception as e:
+            try:
+                rv = flask_app.handle_user_exception(e)
+            except Exception as e:
+                rv = flask_app.handle_exception(e)
+        return flask_app.finalize_request(rv)
+
+
+def start_wsgi(wsgi_app, environ):
+    '''
+    Call a WSGI app and return its status, headers and body iterable
+    '''
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    body = wsgi_app(environ, start_response)
+    return started["status"], started["headers"], body
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    loop = asyncio.get_running_loop()
+    # Async views of all requests run on this loop, so their LLM calls share its AsyncOpenAI client
+    llm.share_loop(loop)
+    environ = build_environ(scope, await read_body(receive))
+    view = async_view(environ)
+    if view is not None:
+        response = await dispatch_async(view, environ)
+        status, headers, body = start_wsgi(response, environ)
+        # Streamed bodies (server-sent events) pull from blocking iterators, so they are read off the loop
+        blocking_body = response.is_streamed
+    else:
+        status, headers, body = await loop.run_in_executor(sync_executor, start_wsgi, flask_app, environ)
+        blocking_body = True
+
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]
+    })
+    # Streamed bodies push the request context while they run, so every read uses the same context
+    context = contextvars.copy_context()
+    try:
+        chunks = iter(body)
+        while True:
+            chunk = await loop.run_in_executor(sync_executor, context.run, next, chunks, None) if blocking_body \
+                else next(chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        if hasattr(body, "close"):
+            await loop.run_in_executor(sync_executor, context.run, body.close)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
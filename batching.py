@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    '''
+    Groups the items submitted concurrently within max_wait seconds into one call of func(items), which must
+    return one result per item. Callers get a Future: sync callers block on future.result(), async callers
+    await asyncio.wrap_future(future) without holding a thread. A lone request waits at most max_wait.
+    ---------------------------------
+    func: batch function, called from a single worker thread
+    max_batch_size: largest number of items per call
+    max_wait: seconds to wait for more items after the first one of a batch arrived
+    max_pending: bound of the queue, submit() blocks while it is full; 0 for no bound
+    '''
+
+    def __init__(self, func, max_batch_size: int = 64, max_wait: float = 0.005, name: str = 'batcher',
+                 max_pending: int = 0) -> None:
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        future = Future()
+        # The worker must run before a bounded queue can block
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def oldest(self):
+        '''
+        Return the item waiting longest for a batch, or None
+        '''
+        try:
+            return self._queue.queue[0][0]
+        except IndexError:
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
+
+    def _ensure_worker(self) -> None:
+        # Started on first use, and again in a forked worker process, which does not inherit the thread.
+        # The child starts from a new queue: the items it inherited are left to the parent, and the condition
+        # of the old queue still lists the parent's waiting thread, which would swallow the next notify
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._pid != os.getpid() or not self._thread.is_alive():
+                    if self._pid is not None and self._pid != os.getpid():
+                        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.func([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
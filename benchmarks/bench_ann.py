@@ -0,0 +1,80 @@
+"""
+Recall@k versus latency of the approximate index types against the exact flat baseline.
+Uses clustered synthetic vectors with the embedding dimension of the local model.
+
+Run from the project root: python -m benchmarks.bench_ann --vectors 200000 --queries 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vector_store import VectorStore
+
+
+def make_vectors(n, dim, clusters=1024, seed=0):
+    # Sentence embeddings are far from uniform, so sample around a set of topic centroids
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, n)
+    return centroids[assignments] + rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def build_store(index_type, vectors, **kwargs):
+    store = VectorStore(vectors.shape[1], index_type=index_type, train_size=min(len(vectors), 100000), **kwargs)
+    articles = [{'url': str(i)} for i in range(len(vectors))]
+    start = time.perf_counter()
+    store.add(articles, vectors)
+    store.train()
+    return store, time.perf_counter() - start
+
+
+def run_queries(store, queries, k, **params):
+    # One query per call, as /similar does, to report per-request latency
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, indices = store.search_vectors(query, k, **params)
+        latencies.append(time.perf_counter() - start)
+        results[i] = indices[0]
+    return results, np.array(latencies) * 1000
+
+
+def recall_at_k(results, ground_truth):
+    hits = sum(len(set(r[r >= 0]) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectors', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=1024)
+    args = parser.parse_args()
+
+    data = make_vectors(args.vectors + args.queries, args.dim)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+
+    flat, build_time = build_store('flat', vectors)
+    ground_truth, flat_latency = run_queries(flat, queries, args.k)
+    print(f"{'index':10} {'param':>14} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'flat':10} {'-':>14} {build_time:8.1f} {1.0:9.3f} "
+          f"{np.percentile(flat_latency, 50):8.3f} {np.percentile(flat_latency, 99):8.3f}")
+    del flat
+
+    sweeps = {
+        'ivf_flat': ('nprobe', [1, 4, 16, 64]),
+        'ivf_pq': ('nprobe', [1, 4, 16, 64]),
+        'hnsw': ('ef_search', [16, 32, 64, 128]),
+    }
+    for index_type, (param, values) in sweeps.items():
+        store, build_time = build_store(index_type, vectors, nlist=args.nlist)
+        for value in values:
+            results, latency = run_queries(store, queries, args.k, **{param: value})
+            print(f"{index_type:10} {param + '=' + str(value):>14} {build_time:8.1f} "
+                  f"{recall_at_k(results, ground_truth):9.3f} "
+                  f"{np.percentile(latency, 50):8.3f} {np.percentile(latency, 99):8.3f}")
+        del store
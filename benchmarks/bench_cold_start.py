@@ -0,0 +1,64 @@
+"""
+Cold start of the backend: time from launching the server process to its first response (/healthz),
+to readiness (/readyz, embedding model loaded) and to the first answered /similar request, for each
+EMBEDDING_WARMUP mode. "eager" loads the model before serving, as main.py did before, "lazy" has no
+readiness time since the model only loads with the first /similar request.
+
+Run from the project root: python -m benchmarks.bench_cold_start --runs 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+SERVER = "import main; main.app.run(port={port}, use_reloader=False)"
+
+
+def wait_for(server, url, start, method='get', **kwargs):
+    while server.poll() is None:
+        try:
+            response = getattr(requests, method)(url, timeout=60, **kwargs)
+            if response.status_code == 200:
+                return time.perf_counter() - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"Server exited with code {server.returncode}")
+
+
+def cold_start(mode, port):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, EMBEDDING_WARMUP=mode, VECTOR_STORE_PATH=os.path.join(tmp, 'vector_store'))
+        base = f"http://127.0.0.1:{port}"
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "-c", SERVER.format(port=port)], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            first_response = wait_for(server, f"{base}/healthz", start)
+            # In lazy mode the model only loads with the first request that needs it
+            ready = wait_for(server, f"{base}/readyz", start) if mode != 'lazy' else float('nan')
+            first_similar = wait_for(server, f"{base}/similar", start, method='post',
+                                     json={"query": "graph neural networks", "rerank": False})
+        finally:
+            server.terminate()
+            server.wait()
+    return first_response, ready, first_similar
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        # Best of several runs, the first one also pays for cold OS file caches
+        first_response, ready, first_similar = (min(times) for times in
+                                                zip(*(cold_start(mode, args.port) for _ in range(args.runs))))
+        print(f"{mode:10}  first response {first_response:6.2f}s   ready {ready:6.2f}s   "
+              f"first /similar {first_similar:6.2f}s")
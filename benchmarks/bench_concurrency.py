@@ -0,0 +1,50 @@
+"""
+Throughput and p50/p95 latency of a running backend under many concurrent in-flight requests,
+to compare the threaded development server (python main.py) with the ASGI server (python asgi.py).
+Slow LLM endpoints are mixed with /similar to show whether fast requests wait behind slow ones.
+
+Run from the project root against a running server:
+python -m benchmarks.bench_concurrency --url http://127.0.0.1:5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+SLOW = ('/expand-keywords', {"query": "graph neural networks"})
+FAST = ('/similar', {"query": "graph neural networks", "rerank": False})
+
+
+async def timed_post(client, path, body):
+    start = time.perf_counter()
+    response = await client.post(path, json=body)
+    response.raise_for_status()
+    return path, (time.perf_counter() - start) * 1000
+
+
+async def run(url, concurrency, fast_ratio):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        n_fast = int(concurrency * fast_ratio)
+        requests = [FAST] * n_fast + [SLOW] * (concurrency - n_fast)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed_post(client, path, body) for path, body in requests))
+        elapsed = time.perf_counter() - start
+
+    print(f"{concurrency} requests in {elapsed:.2f}s ({concurrency / elapsed:.1f} req/s)")
+    for path, _ in (SLOW, FAST):
+        latencies = np.array([latency for p, latency in results if p == path])
+        if len(latencies):
+            print(f"  {path:18} n={len(latencies):4}  p50 {np.percentile(latencies, 50):8.1f} ms   "
+                  f"p95 {np.percentile(latencies, 95):8.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--fast-ratio', type=float, default=0.5, help='share of /similar requests')
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.fast_ratio))
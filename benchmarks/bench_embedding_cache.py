@@ -0,0 +1,69 @@
+"""
+Encoding time saved by the embedding cache when the same abstracts come back, as they do across searches
+on related queries, and the size and precision of float16 storage against float32.
+
+Run from the project root: python -m benchmarks.bench_embedding_cache --articles 1000 --repeat-ratio 0.7
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import embedding
+from embedding_cache import EmbeddingCache
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+def run(cache, batches):
+    start = time.perf_counter()
+    for texts in batches:
+        cache.embed(embedding.model_name(), texts, lambda missing: (embedding.encode(missing), None))
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--repeat-ratio', type=float, default=0.7, help='share of abstracts seen before')
+    args = parser.parse_args()
+
+    # Batches of search results, each mixing new abstracts with ones seen before
+    rng = random.Random(0)
+    summaries = [" ".join(rng.choice(WORDS) for _ in range(150)) for _ in range(args.articles)]
+    batches, seen = [], []
+    for i in range(0, len(summaries), args.batch_size):
+        batch = summaries[i:i + args.batch_size]
+        repeats = int(len(batch) * args.repeat_ratio)
+        batches.append(rng.sample(seen, min(repeats, len(seen))) + batch)
+        seen.extend(batch)
+    texts = sum(len(batch) for batch in batches)
+    embedding.get_model()
+
+    uncached = time.perf_counter()
+    for batch in batches:
+        embedding.encode(batch)
+    uncached = time.perf_counter() - uncached
+    print(f"no cache:        {uncached:7.2f}s for {texts} texts")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ('float32', 'float16'):
+            cache = EmbeddingCache(path=os.path.join(tmp, f'{dtype}.sqlite'), dtype=dtype)
+            elapsed = run(cache, batches)
+            stats = cache.stats()
+            print(f"{dtype} cache:   {elapsed:7.2f}s  hit rate {stats['hit_rate']:.2f}  "
+                  f"encoding time saved {stats['seconds_saved']:.2f}s  size {stats['bytes'] / 2 ** 20:.2f} MiB")
+            rewarm = run(cache, batches)
+            print(f"  rerun, all cached: {rewarm:7.2f}s")
+
+        exact = embedding.encode(summaries[:100])
+        stored = EmbeddingCache(dtype='float16')
+        stored.embed('exact', summaries[:100], lambda missing: (exact, None))
+        restored = stored.embed('exact', summaries[:100], lambda missing: (None, None))
+        print(f"float16 max abs error {np.abs(restored - exact).max():.2e}, "
+              f"min cosine {min(np.dot(a, b) / np.linalg.norm(a) / np.linalg.norm(b) for a, b in zip(restored, exact)):.6f}")
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark for article ingestion into the local FAISS index.
+Compares one encode/index.add per article against a single batched call, and against the background
+ingestion queue of /search: the time a request spends queueing its articles, and the time until they are indexed.
+
+Run from the project root: python -m benchmarks.bench_ingestion --articles 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from embedding_cache import EmbeddingCache
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision "
+         "embedding contrastive sparse quantization inference latency robustness").split()
+
+
+def make_articles(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'title': f"Synthetic paper {i}",
+        'summary': " ".join(rng.choice(WORDS) for _ in range(150)),
+        'url': f"http://arxiv.org/abs/bench.{seed}.{i:05d}",
+        'authors': ["Author A", "Author B"],
+        'published_date': '2024-01-01'
+    } for i in range(n)]
+
+
+def reset_db():
+    main.ingestion_queue.flush()
+    main.vector_store = main.VectorStore(main.dim, index_type=main.vector_store.index_type)
+    main.articles_db = main.vector_store.articles
+    # Start from an empty embedding cache, so every run encodes all articles
+    main.embedding._cache = EmbeddingCache()
+
+
+def bench_single(articles):
+    reset_db()
+    start = time.perf_counter()
+    for article in articles:
+        main.add_article_to_db(article)
+    return time.perf_counter() - start
+
+
+def bench_batched(articles, batch_size):
+    reset_db()
+    start = time.perf_counter()
+    main.add_articles_to_db(articles, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def bench_queued(articles, per_request):
+    # Articles arrive per request, as /search queues them
+    reset_db()
+    start = time.perf_counter()
+    for i in range(0, len(articles), per_request):
+        main.enqueue_articles(articles[i:i + per_request])
+    queued = time.perf_counter() - start
+    main.ingestion_queue.flush()
+    return queued, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, help='EMBED_BATCH_SIZE of main.py by default')
+    parser.add_argument('--per-request', type=int, default=12, help='articles queued by each /search request')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Keep the app singletons created on import away from the production store and caches
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['VECTOR_STORE_PATH'] = os.path.join(tmp.name, 'vector_store')
+    os.environ['CACHE_PATH'] = os.path.join(tmp.name, 'cache.sqlite')
+    os.environ['EMBEDDING_CACHE_PATH'] = os.path.join(tmp.name, 'embeddings.sqlite')
+    os.environ['DOCUMENT_STORE_PATH'] = os.path.join(tmp.name, 'documents.sqlite')
+    import main
+    args.batch_size = args.batch_size or main.EMBED_BATCH_SIZE
+
+    articles = make_articles(args.articles)
+    # Warm up the model so the first timed run does not pay for lazy initialization
+    main.embedding.encode([articles[0]['summary']])
+
+    single = min(bench_single(articles) for _ in range(args.repeat))
+    batched = min(bench_batched(articles, args.batch_size) for _ in range(args.repeat))
+    queued, indexed = min(bench_queued(articles, args.per_request) for _ in range(args.repeat))
+    reset_db()
+
+    print(f"articles:  {args.articles}")
+    print(f"single:    {args.articles / single:10.1f} articles/sec ({single:.3f}s)")
+    print(f"batched:   {args.articles / batched:10.1f} articles/sec ({batched:.3f}s, batch_size={args.batch_size})")
+    print(f"speedup:   {single / batched:10.2f}x")
+    requests = -(-args.articles // args.per_request)
+    print(f"queued:    {queued / requests * 1000:10.3f} ms per request on the response path, "
+          f"all indexed after {indexed:.3f}s")
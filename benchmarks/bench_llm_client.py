@@ -0,0 +1,50 @@
+"""
+p50/p95 latency of small chat completions with a fresh OpenAI client per call, as the endpoints
+used to do, against the shared pooled client from llm.py.
+Makes real API calls (max_tokens=1) with OPENAI_API_KEY from .env.
+
+Run from the project root: python -m benchmarks.bench_llm_client --requests 50
+"""
+import argparse
+import os
+import time
+
+import dotenv
+import numpy as np
+from openai import OpenAI
+
+import llm
+
+
+def run(create, requests, model):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        create(model=model, messages=[{"role": "user", "content": "Reply with OK."}], max_tokens=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def fresh_client_create(**kwargs):
+    client = OpenAI(base_url=os.getenv("OPENAI_BASE_URL", llm.BASE_URL), api_key=os.getenv("OPENAI_API_KEY"))
+    return client.chat.completions.create(**kwargs)
+
+
+def shared_client_create(**kwargs):
+    return llm.chat_completion("benchmark", **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--model', default='gpt-4o-mini')
+    args = parser.parse_args()
+    dotenv.load_dotenv(dotenv_path=".env")
+
+    # Warm up DNS and the shared pool so neither mode pays for first-call setup
+    shared_client_create(model=args.model, messages=[{"role": "user", "content": "Reply with OK."}], max_tokens=1)
+
+    for name, create in (("fresh client", fresh_client_create), ("shared client", shared_client_create)):
+        latencies = run(create, args.requests, args.model)
+        print(f"{name:14} p50 {np.percentile(latencies, 50):8.1f} ms   p95 {np.percentile(latencies, 95):8.1f} ms")
+    print("shared client token usage:", llm.metrics.summary())
@@ -0,0 +1,95 @@
+"""
+Export, streaming load and random access of the local database file at 100k and 1M papers,
+compared against the previous whole-file JSON format.
+Peak memory is the peak of Python allocations measured with tracemalloc in a separate pass.
+
+Run from the project root: python -m benchmarks.bench_local_database --sizes 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import database
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+def iter_papers(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        url = f"http://arxiv.org/abs/{2000 + i // 100000}.{i % 100000:05d}v1"
+        yield url, {
+            'title': f"Synthetic paper {i}",
+            'summary': " ".join(rng.choice(WORDS) for _ in range(120)),
+            'url': url,
+            'authors': ["Author A", "Author B", "Author C"],
+            'published_date': '2024-01-01'
+        }
+
+
+def measure(func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def legacy_export(n, path):
+    with open(path, 'w') as f:
+        json.dump(dict(iter_papers(n)), f)
+
+
+def legacy_load(path):
+    with open(path) as f:
+        return json.loads(f.read())
+
+
+def random_access(path, n, lookups=10000):
+    rng = random.Random(1)
+    ids = [f"{2000 + i // 100000}.{i % 100000:05d}v1" for i in (rng.randrange(n) for _ in range(lookups))]
+    with database.LocalDatabaseReader(path) as reader:
+        start = time.perf_counter()
+        for paper_id in ids:
+            reader.get(paper_id)
+        return lookups / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--skip-legacy', action='store_true', help='skip the whole-file JSON baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, 'articles_db.jsonl')
+            print(f"papers: {n}")
+            export_time, export_peak = measure(lambda: database.export_local_database(iter_papers(n), path))
+            print(f"  jsonl export:      {export_time:7.2f}s  peak {export_peak:8.1f} MiB  "
+                  f"size {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+            load_time, load_peak = measure(lambda: consume(database.iter_local_database(path)))
+            print(f"  jsonl stream load: {load_time:7.2f}s  peak {load_peak:8.1f} MiB")
+            print(f"  jsonl random access: {random_access(path, n):10.0f} lookups/s")
+
+            if not args.skip_legacy:
+                legacy_path = os.path.join(tmp, 'articles_db.json')
+                export_time, export_peak = measure(lambda: legacy_export(n, legacy_path))
+                print(f"  json export:       {export_time:7.2f}s  peak {export_peak:8.1f} MiB")
+                load_time, load_peak = measure(lambda: legacy_load(legacy_path))
+                print(f"  json load:         {load_time:7.2f}s  peak {load_peak:8.1f} MiB")
+                os.remove(legacy_path)
+            os.remove(path)
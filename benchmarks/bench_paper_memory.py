@@ -0,0 +1,109 @@
+"""
+Memory per 100k papers of the article representations, measured with tracemalloc:
+- dict: the article dicts main.py keeps, one per paper with its own key strings, as parsed from JSON
+- Paper (__dict__): the previous database.Paper, with a per-instance attribute dict
+- Paper (__slots__): the current database.Paper
+- ArticleTable: the compact JSON rows VectorStore keeps the article metadata in
+Text (titles, abstracts, URLs, authors) is the same in every representation; the overhead column is
+what each one needs on top of the UTF-8 bytes of the text.
+
+Run from the project root: python -m benchmarks.bench_paper_memory --papers 100000
+"""
+import argparse
+import datetime
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from database import Paper
+from vector_store import ArticleTable
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+class DictPaper:
+    # The previous Paper, with a per-instance __dict__
+    def __init__(self, url, title, summary, authors, date):
+        self.id = url.split('/')[-1]
+        self.url = url
+        self.title = title
+        self.summary = summary
+        self.authors = authors
+        self.date = date
+        self.citations = -1
+
+
+def make_lines(n, seed=0):
+    rng = random.Random(seed)
+    return [json.dumps({
+        'title': " ".join(rng.choice(WORDS) for _ in range(8)).title(),
+        'summary': " ".join(rng.choice(WORDS) for _ in range(150)),
+        'url': f"http://arxiv.org/abs/{2400 + i // 100000}.{i % 100000:05d}v1",
+        'authors': [f"Author {rng.randrange(10000)}" for _ in range(4)],
+        'published': str(datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(2000)))
+    }) for i in range(n)]
+
+
+def to_paper(cls, article):
+    return cls(url=article['url'], title=article['title'], summary=article['summary'],
+               authors=article['authors'], date=datetime.date.fromisoformat(article['published']))
+
+
+def to_table(lines):
+    table = ArticleTable()
+    for line in lines:
+        table.append(json.loads(line))
+    return table
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--papers', type=int, default=100000)
+    args = parser.parse_args()
+
+    lines = make_lines(args.papers)
+    articles = [json.loads(line) for line in lines]
+    text_bytes = sum(len(a['title'].encode()) + len(a['summary'].encode()) + len(a['url'].encode())
+                     + sum(len(author.encode()) for author in a['authors']) for a in articles)
+
+    representations = {
+        'dict': lambda: [json.loads(line) for line in lines],
+        'Paper (__dict__)': lambda: [to_paper(DictPaper, json.loads(line)) for line in lines],
+        'Paper (__slots__)': lambda: [to_paper(Paper, json.loads(line)) for line in lines],
+        'ArticleTable': lambda: to_table(lines)
+    }
+    scale = 100000 / args.papers
+    print(f"{args.papers} papers, text {text_bytes * scale / 2 ** 20:.1f} MiB per 100k")
+    print(f"{'representation':<20} {'MiB/100k':>10} {'overhead MiB/100k':>18} {'B/paper':>8} {'build s':>8}")
+    for name, build in representations.items():
+        result, size, seconds = measure(build)
+        print(f"{name:<20} {size * scale / 2 ** 20:10.1f} {(size - text_bytes) * scale / 2 ** 20:18.1f} "
+              f"{size / args.papers:8.0f} {seconds:8.2f}")
+        del result
+
+    table = to_table(lines)
+    start = time.perf_counter()
+    for url in table:
+        table[url]
+    print(f"ArticleTable lookup and decode: {(time.perf_counter() - start) / args.papers * 1e6:.2f} us/paper, "
+          f"nbytes {table.nbytes * scale / 2 ** 20:.1f} MiB/100k")
+
+    papers = [to_paper(Paper, article) for article in articles]
+    start = time.perf_counter()
+    metadata = [paper.to_metadata() for paper in papers]
+    restored = [Paper.from_metadata(m) for m in metadata]
+    print(f"to_metadata + from_metadata: {(time.perf_counter() - start) / args.papers * 1e6:.2f} us/paper")
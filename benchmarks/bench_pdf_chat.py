@@ -0,0 +1,85 @@
+"""
+Prompt size and latency of /chat about an open PDF: the whole text pasted into the prompt ("full")
+against the top-k chunks retrieved from the per-document chunk index ("chunks").
+
+Without --llm, only the PDF section of the prompt is built: its size, in characters and estimated tokens
+(4 characters per token), and the time to build it, the first question of the chunk mode including
+the chunk index build. With --llm, every question also goes through /chat, and the prompt tokens
+billed and the end-to-end latency are reported (needs OPENAI_API_KEY).
+
+Run from the project root: python -m benchmarks.bench_pdf_chat --pdf-url https://arxiv.org/pdf/1706.03762v7 --llm
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+QUESTIONS = [
+    "What problem does this paper address?",
+    "Summarize the method in a few sentences.",
+    "Which datasets are used in the experiments?",
+    "What are the main limitations discussed by the authors?",
+    "How does the approach compare to previous work?"
+]
+
+
+def load_pages(args):
+    import httpx
+    import pdf_text
+    from document_store import file_doc_id
+
+    if not args.pdf_url:
+        from benchmarks.bench_pdf_extraction import make_pdf
+        pdf_file = pdf_text.write_temporary(make_pdf(args.pages))
+    else:
+        async def download():
+            async with httpx.AsyncClient(follow_redirects=True, timeout=60) as client:
+                return await pdf_text.download(client, args.pdf_url)
+
+        pdf_file = asyncio.run(download())
+    with pdf_file:
+        return file_doc_id(pdf_file.name), list(pdf_text.iter_pages(pdf_file.name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pdf-url', help='PDF to discuss, a generated one by default')
+    parser.add_argument('--pages', type=int, default=30, help='pages of the generated PDF')
+    parser.add_argument('--llm', action='store_true', help='also send every question through /chat')
+    parser.add_argument('--model', default='gpt-4o-mini')
+    args = parser.parse_args()
+
+    import main
+    import llm
+
+    doc_id, pages = load_pages(args)
+    main.document_store.put(doc_id, pages)
+    main.embedding.get_model()
+    client = main.app.test_client()
+    print(f"{len(pages)} pages, {len(main.pdf_text.join_pages(pages))} characters of text")
+
+    print(f"{'mode':<7} {'context chars':>14} {'est. tokens':>12} {'first ms':>9} {'then ms':>8}"
+          + (f" {'prompt tokens':>14} {'e2e ms p50':>11}" if args.llm else ""))
+    for mode in ('full', 'chunks'):
+        sizes, times = [], []
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            context, used = main.get_pdf_context(question, doc_id, pages, mode)
+            times.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(context))
+        line = (f"{used:<7} {np.mean(sizes):14.0f} {np.mean(sizes) / 4:12.0f} {times[0]:9.1f} "
+                f"{np.mean(times[1:]):8.2f}")
+
+        if args.llm:
+            latencies = []
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                response = client.post('/chat', json={"query": question, "pdf_doc_id": doc_id,
+                                                      "pdf_context": mode, "model": args.model})
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    print(f"  /chat failed: {response.get_json()}")
+            tokens = llm.metrics.summary().get(f"chat_with_agent.pdf_{used}.prompt_tokens", {}).get("mean", float('nan'))
+            line += f" {tokens:14.0f} {np.percentile(latencies, 50):11.0f}"
+        print(line)
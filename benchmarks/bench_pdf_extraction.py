@@ -0,0 +1,132 @@
+"""
+End-to-end /extract-pdf-text extraction of a generated text PDF served over local HTTP.
+
+- current: the previous path, the whole response in memory, pages parsed one by one, text built with +=
+- parallel: the download streamed into a temporary file, one range of pages parsed per process of the
+  PDF pool, the first one in the calling thread, and joined
+The first page column is when the client can use page 1: with the whole response for the current path,
+as soon as it is parsed for the streamed one. Parallel parsing needs as many free cores as workers.
+
+Run from the project root: python -m benchmarks.bench_pdf_extraction --pages 100 --workers 4
+"""
+import argparse
+import asyncio
+import http.server
+import os
+import random
+import threading
+import time
+from io import BytesIO
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+def make_pdf(pages, lines_per_page=45, seed=0):
+    # A minimal PDF with one Helvetica text block per page
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages)
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def serve(content):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/paper.pdf"
+
+
+def current(url):
+    import httpx
+    from PyPDF2 import PdfReader
+
+    start = time.perf_counter()
+    response = httpx.get(url)
+    pdf_reader = PdfReader(BytesIO(response.content))
+    text_content = ""
+    for page_num in range(len(pdf_reader.pages)):
+        page = pdf_reader.pages[page_num]
+        text_content += page.extract_text() + "\n\n"
+    # The client only receives page 1 with the complete response
+    total = time.perf_counter() - start
+    return text_content, total, total
+
+
+def parallel(url):
+    import httpx
+    import pdf_text
+
+    async def download():
+        async with httpx.AsyncClient() as client:
+            return await pdf_text.download(client, url)
+
+    start = time.perf_counter()
+    parts = []
+    first_page = None
+    with asyncio.run(download()) as pdf_file:
+        for text in pdf_text.iter_pages(pdf_file.name):
+            parts.append(text + "\n\n")
+            first_page = first_page or time.perf_counter() - start
+    return "".join(parts), first_page, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--min-pages-per-worker', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['PDF_WORKERS'] = str(args.workers)
+    os.environ['PDF_MIN_PAGES_PER_WORKER'] = str(args.min_pages_per_worker)
+    import pdf_text
+
+    content = make_pdf(args.pages)
+    server, url = serve(content)
+    # Start the worker processes outside the timed runs
+    list(pdf_text.get_executor().map(abs, range(args.workers)))
+
+    print(f"{args.pages} pages, {len(content) / 2 ** 20:.2f} MiB, {args.workers} workers")
+    results = {}
+    for name, run in (('current', current), ('parallel', parallel)):
+        runs = [run(url) for _ in range(args.repeat)]
+        text, first_page, total = min(runs, key=lambda r: r[2])
+        results[name] = text
+        print(f"{name:<9} first page {first_page * 1000:8.1f} ms   total {total * 1000:8.1f} ms")
+    assert results['current'] == results['parallel'], 'extracted text differs'
+    print("extracted text identical")
+    server.shutdown()
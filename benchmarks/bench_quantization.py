@@ -0,0 +1,89 @@
+"""
+Recall and memory of the compressed index types against the exact float32 flat index.
+
+The evaluation set is fixed: seeded clustered unit vectors, the shape of sentence embeddings, or the
+vector log of an existing store (--vectors vector_store/vectors.f32). Queries are held-out perturbed
+copies of stored vectors. Every index type is built in a persisted store and snapshotted, as in
+production, then searched with and without exact reranking from the vector log.
+Recall@k is the fraction of the exact top k found in the returned top k.
+
+Run from the project root: python -m benchmarks.bench_quantization --articles 50000 --rerank 4
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from vector_store import VectorStore, INDEX_TYPES
+
+
+def make_embeddings(n, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(embeddings, n, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.choice(len(embeddings), n, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def build(index_type, embeddings, path, rerank_factor, nlist):
+    articles = [{'url': f"http://arxiv.org/abs/bench.{i}", 'title': f"Synthetic paper {i}"}
+                for i in range(len(embeddings))]
+    store = VectorStore(embeddings.shape[1], index_type=index_type, path=path, nlist=nlist,
+                        train_size=min(len(embeddings), 39 * 256), snapshot_every=len(embeddings) + 1,
+                        rerank_factor=rerank_factor)
+    for i in range(0, len(embeddings), 10000):
+        store.add(articles[i:i + 10000], embeddings[i:i + 10000])
+    store.train()
+    store.save()
+    return store
+
+
+def evaluate(store, queries, truth, k):
+    start = time.perf_counter()
+    _, indices = store.search_vectors(queries, k=k, nprobe=32, ef_search=128)
+    latency = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(found) & set(expected)) / k for found, expected in zip(indices, truth)])
+    return recall, latency
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--index-types', nargs='+', choices=INDEX_TYPES,
+                        default=['flat', 'sq_fp16', 'sq8', 'pq', 'ivf_pq', 'hnsw'])
+    parser.add_argument('--articles', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--vectors', help='raw float32 vector log to evaluate on instead of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=4, help='candidates per result when reranking')
+    parser.add_argument('--nlist', type=int, default=256)
+    args = parser.parse_args()
+
+    if args.vectors:
+        embeddings = np.fromfile(args.vectors, dtype=np.float32).reshape(-1, args.dim)
+    else:
+        embeddings = make_embeddings(args.articles, args.dim)
+    queries = make_queries(embeddings, args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = build('flat', embeddings, f"{tmp}/baseline", None, args.nlist)
+        _, truth = baseline.search_vectors(queries, k=args.k)
+
+    print(f"{len(embeddings)} vectors of dimension {args.dim}, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<10} {'rerank':>6} {'recall':>8} {'ms/query':>9} {'index B/paper':>14} {'total B/paper':>14}")
+    for index_type in args.index_types:
+        for rerank_factor in (None, args.rerank):
+            if rerank_factor is not None and index_type == 'flat':
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                store = build(index_type, embeddings, tmp, rerank_factor, args.nlist)
+                recall, latency = evaluate(store, queries, truth, args.k)
+                usage = store.memory_usage()["bytes_per_paper"]
+            print(f"{index_type:<10} {rerank_factor or '-':>6} {recall:8.4f} {latency:9.3f} "
+                  f"{usage['index']:14.1f} {usage['total']:14.1f}")
@@ -0,0 +1,82 @@
+"""
+Throughput and latency of query encoding under concurrent load, as /similar sees it.
+
+Client threads each encode distinct queries, one at a time:
+- direct: every query is its own forward pass on a single embedding thread, as before micro-batching
+- batched: queries go through embedding.encode_query, which groups those arriving within the batch wait
+  into one forward pass
+- cached: the batched run repeated, every query now answered by the query LRU
+
+Run from the project root: python -m benchmarks.bench_query_batching --clients 1 8 32 --wait-ms 2 5 10
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+def make_queries(n, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(8)) + f" {seed}-{i}" for i in range(n)]
+
+
+def run_clients(encode, clients, queries_per_client, seed):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(i):
+        for query in make_queries(queries_per_client, seed * 1000 + i):
+            start = time.perf_counter()
+            encode(query)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def report(name, result):
+    throughput, p50, p99 = result
+    print(f"  {name:<18} {throughput:8.1f} queries/s   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--queries', type=int, default=50, help='queries per client')
+    parser.add_argument('--wait-ms', type=float, nargs='+', default=[5])
+    args = parser.parse_args()
+
+    import embedding
+    from batching import MicroBatcher
+
+    embedding.get_model()
+    pool = ThreadPoolExecutor(max_workers=1)
+
+    def direct(query):
+        return pool.submit(embedding.encode, [query]).result()[0]
+
+    for seed, clients in enumerate(args.clients):
+        print(f"{clients} concurrent clients, {args.queries} queries each")
+        report("direct", run_clients(direct, clients, args.queries, seed))
+        for wait_ms in args.wait_ms:
+            embedding._query_batcher = MicroBatcher(embedding._encode_batch, max_wait=wait_ms / 1000,
+                                                    max_batch_size=int(os.getenv("QUERY_BATCH_SIZE", "64")))
+            embedding._query_cache.clear()
+            report(f"batched {wait_ms:g} ms", run_clients(embedding.encode_query, clients, args.queries, seed))
+            stats = embedding.query_stats()["batching"]
+            print(f"  {'':<18} mean batch size {stats['mean_batch_size']:.1f}")
+        report("cached", run_clients(embedding.encode_query, clients, args.queries, seed))
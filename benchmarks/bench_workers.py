@@ -0,0 +1,123 @@
+"""
+Memory per worker process and cross-worker consistency of the multi-process mode.
+
+Workers are started like gunicorn does: forked from a parent that preloaded main.py (as with
+preload_app in gunicorn.conf.py), or spawned so each loads its own model and store.
+One worker ingests synthetic articles, then every worker answers the same /similar queries, which must
+agree once the refresh interval passed, and a search cache entry set by one worker is read by another.
+RSS counts shared pages in full for every process; PSS splits them between the processes sharing them,
+so the sum of PSS is the real memory of the deployment (Linux only).
+
+Run from the project root: python -m benchmarks.bench_workers --workers 4 --mode fork spawn
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+WORDS = ("neural network transformer attention graph retrieval language model training "
+         "optimization gradient diffusion reinforcement learning benchmark dataset vision").split()
+
+
+def make_articles(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'title': f"Synthetic paper {i}",
+        'summary': " ".join(rng.choice(WORDS) for _ in range(60)),
+        'url': f"http://arxiv.org/abs/2500.{i:05d}v1",
+        'authors': ["Author A"],
+        'published': '2025-01-01'
+    } for i in range(n)]
+
+
+def memory():
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            if name in ('Rss', 'Pss'):
+                usage[name.lower()] = int(value.split()[0]) / 1024
+    return usage
+
+
+def worker(conn):
+    import main
+
+    client = main.app.test_client()
+    while True:
+        command, payload = conn.recv()
+        if command == 'ingest':
+            conn.send(main.add_articles_to_db(payload))
+        elif command == 'similar':
+            responses = [client.post('/similar', json={"query": query, "rerank": False}) for query in payload]
+            conn.send([[paper['url'] for paper in response.get_json()] for response in responses])
+        elif command == 'cache_set':
+            conn.send(main.search_cache.set(*payload))
+        elif command == 'cache_get':
+            conn.send(main.search_cache.get(payload))
+        elif command == 'memory':
+            conn.send(memory())
+        else:
+            conn.send(None)
+            return
+
+
+def run(mode, workers, articles, refresh_interval):
+    if mode == 'fork':
+        # Preload in the parent, the workers share its pages copy-on-write
+        import main  # noqa: F401
+    context = multiprocessing.get_context(mode)
+    connections, processes = [], []
+    for _ in range(workers):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=worker, args=(child_conn,))
+        process.start()
+        connections.append(parent_conn)
+        processes.append(process)
+
+    def call(i, command, payload=None):
+        connections[i].send((command, payload))
+        return connections[i].recv()
+
+    start = time.perf_counter()
+    added = call(0, 'ingest', articles)
+    print(f"  worker 0 ingested {added} articles in {time.perf_counter() - start:.2f}s")
+    time.sleep(refresh_interval * 2)
+
+    queries = [" ".join(random.Random(i).sample(WORDS, 4)) for i in range(20)]
+    answers = [call(i, 'similar', queries) for i in range(workers)]
+    agreeing = sum(answers[i] == answers[0] for i in range(workers))
+    print(f"  /similar answers identical on {agreeing} of {workers} workers")
+
+    call(0, 'cache_set', ("bench-key", {"papers": []}))
+    seen = sum(call(i, 'cache_get', "bench-key") is not None for i in range(workers))
+    print(f"  search cache entry set by worker 0 seen by {seen} of {workers} workers")
+
+    usages = [call(i, 'memory') for i in range(workers)]
+    for i, usage in enumerate(usages):
+        print(f"  worker {i}: RSS {usage['rss']:8.1f} MiB   PSS {usage['pss']:8.1f} MiB")
+    print(f"  total PSS of the workers: {sum(usage['pss'] for usage in usages):.1f} MiB")
+
+    for i in range(workers):
+        call(i, 'stop')
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--mode', nargs='+', choices=['fork', 'spawn'], default=['fork', 'spawn'])
+    parser.add_argument('--refresh-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    for mode in args.mode:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['VECTOR_STORE_PATH'] = os.path.join(tmp, 'vector_store')
+            os.environ['VECTOR_STORE_REFRESH_INTERVAL'] = str(args.refresh_interval)
+            os.environ['CACHE_PATH'] = os.path.join(tmp, 'cache.sqlite')
+            print(f"{mode}: {args.workers} workers")
+            run(mode, args.workers, make_articles(args.articles), args.refresh_interval)
@@ -0,0 +1,109 @@
+"""
+Stress test of a VectorStore shared between threads: writer threads ingest overlapping batches, as
+concurrent /search requests do, while reader threads run the nearest-neighbour lookups of /similar.
+Every article has its own embedding, so a reader that looks up a stored article must get that article
+back as the top hit; with the exact flat index any other answer means a row id was mapped to the wrong
+metadata, approximate indexes may also miss it now and then.
+At the end the store must hold every article exactly once, and a persisted store must reload the same.
+A search of the empty store, before the writers start, must return no hits.
+
+Run from the project root: python -m benchmarks.stress_vector_store --index-type sq8 --persist --rerank-factor 4
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from vector_store import VectorStore, INDEX_TYPES
+
+
+def make_embeddings(n, dim, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def article(i):
+    url = f"http://arxiv.org/abs/{2400 + i // 100000}.{i % 100000:05d}v1"
+    return {'title': f"Synthetic paper {i}", 'summary': '', 'url': url, 'id': i}
+
+
+def writer(store, embeddings, batch_size, seed, stop):
+    # Batches overlap between writers, like concurrent searches returning the same papers
+    rng = random.Random(seed)
+    while not stop.is_set():
+        ids = rng.sample(range(len(embeddings)), batch_size)
+        store.add([article(i) for i in ids], embeddings[ids])
+
+
+def reader(store, embeddings, seed, stop, stats):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        i = rng.randrange(len(embeddings))
+        start = time.perf_counter()
+        results = store.search(embeddings[i], k=5, nprobe=64, ef_search=128)
+        latency = (time.perf_counter() - start) * 1000
+        with stats['lock']:
+            stats['latencies'].append(latency)
+            if article(i)['url'] in store and results[0]['id'] != i:
+                # The article was stored before the search began, so it should be the top hit
+                stats['errors'].append((i, results[0]['id']))
+
+
+def check_store(store, embeddings):
+    urls = store.articles.urls
+    assert len(urls) == len(set(urls)), 'duplicate rows'
+    assert set(urls) == set(store.articles), 'rows and metadata disagree'
+    assert len(urls) == store.index.ntotal + store.buffer.ntotal, 'rows and vectors disagree'
+    ids = np.array([store.articles[url]['id'] for url in urls])
+    _, indices = store.search_vectors(embeddings[ids], k=1, nprobe=64, ef_search=128)
+    mismatches = int((indices[:, 0] != np.arange(len(ids))).sum())
+    # Approximate indexes may miss the exact row now and then, exact ones never
+    print(f"rows not found as their own top hit: {mismatches} of {len(ids)}")
+    if store.index_type == 'flat':
+        assert mismatches == 0, f'{mismatches} rows map to the wrong article'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat')
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--persist', action='store_true', help='persist the store, with frequent snapshots')
+    parser.add_argument('--rerank-factor', type=int, help='rerank candidates from the vector log, needs --persist')
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(args.articles, args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp if args.persist else None
+        options = dict(index_type=args.index_type, nlist=32, train_size=args.articles // 4, path=path,
+                       snapshot_every=args.articles // 10, rerank_factor=args.rerank_factor)
+        store = VectorStore(args.dim, **options)
+        assert store.search(embeddings[0]) == [], 'the empty store returned hits'
+        stop = threading.Event()
+        stats = {'lock': threading.Lock(), 'latencies': [], 'errors': []}
+        threads = [threading.Thread(target=writer, args=(store, embeddings, args.batch_size, i, stop))
+                   for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(store, embeddings, 1000 + i, stop, stats))
+                    for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies = np.array(stats['latencies'])
+        print(f"{args.index_type}: {len(store)} rows, trained {store.is_trained}, "
+              f"{len(latencies)} searches, p50 {np.percentile(latencies, 50):.2f} ms, "
+              f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms")
+        print(f"wrong top hits during ingestion: {len(stats['errors'])}")
+        check_store(store, embeddings)
+        if path is not None:
+            check_store(VectorStore(args.dim, **options), embeddings)
+        print("store consistent")
@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SQLiteConnection:
+    '''
+    Connection to a SQLite file shared by the threads of one process, opened on first use; callers serialize
+    access with their own lock. A connection must not be used across fork, so a worker process forked from
+    a preloaded app opens its own on its first call. File databases use WAL, which lets readers in other
+    processes proceed while one process writes.
+    ---------------------------------
+    path: SQLite file, None for an in-memory database private to the object, which a forked process keeps
+    '''
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self._db = None
+        self._pid = None
+
+    def __call__(self) -> sqlite3.Connection:
+        if self._db is None or (self.path is not None and self._pid != os.getpid()):
+            self._db = sqlite3.connect(self.path or ':memory:', check_same_thread=False, timeout=30)
+            if self.path is not None:
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._db
+
+
+class Cache:
+    '''
+    Thread-safe LRU cache with a TTL per entry.
+    With a path, entries are also written to a SQLite file, which serves as a second tier
+    that survives restarts. Values must then be JSON-serializable. Several processes, and several caches
+    with their own table, can share one file: each process keeps its own in-memory tier, so an entry set
+    by one process is seen by the others on their next miss.
+    ---------------------------------
+    max_entries: bound of the in-memory tier, least recently used entries are evicted first
+    max_bytes: optional bound of the in-memory tier on the JSON size of the values
+    ttl: seconds an entry stays valid, None for no expiry
+    path: SQLite file of the second tier, None to keep the cache in memory only
+    '''
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = None, ttl: float = None, path: str = None,
+                 table: str = 'cache') -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table = table
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.path = path
+        self._connection = SQLiteConnection(path)
+        if path is not None:
+            db = self._connection()
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            db.execute(f"DELETE FROM {table} WHERE expires_at < ?", (time.time(),))
+            db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default=None):
+        '''
+        Return the cached value, or default when it is missing or expired
+        '''
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+            if self.path is not None:
+                row = self._connection().execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[1] is None or row[1] > now):
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        '''
+        Store a value, ttl overrides the cache default for this entry
+        '''
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self.path is not None:
+                db = self._connection()
+                db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at))
+                db.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+            if self.path is not None:
+                db = self._connection()
+                db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.path is not None:
+                db = self._connection()
+                db.execute(f"DELETE FROM {self.table}")
+                db.commit()
+
+    def stats(self) -> dict:
+        '''
+        Hit/miss counters and sizes, to size the cache
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _store(self, key, value, expires_at) -> None:
+        self._remove(key)
+        size = len(json.dumps(value, default=str)) if self.max_bytes is not None else 0
+        self._entries[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and len(self._entries) > 1):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
@@ -0,0 +1,91 @@
+import os
+import re
+
+import faiss
+import numpy as np
+
+import embedding
+from cache import Cache
+
+# Characters per chunk, overlap between consecutive chunks of a page, and chunks put in a prompt
+CHUNK_CHARS = int(os.getenv("PDF_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("PDF_CHUNK_OVERLAP", "200"))
+CHUNK_TOP_K = int(os.getenv("PDF_CHUNK_TOP_K", "5"))
+
+# Chunk indexes of recently discussed documents, keyed by document id
+_indexes = Cache(max_entries=int(os.getenv("PDF_CHUNK_INDEX_CACHE_SIZE", "64")))
+
+
+def split_pages(pages: list[str], chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> list[dict]:
+    '''
+    Split the text of every page into chunks of about chunk_chars characters, cut at whitespace,
+    each starting overlap characters before the end of the previous one
+    '''
+    chunks = []
+    for page_number, text in enumerate(pages, start=1):
+        text = re.sub(r'\s+', ' ', text).strip()
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_chars, len(text))
+            if end < len(text):
+                # Cut at the last space of the window, unless it holds a single long word
+                space = text.rfind(' ', start + chunk_chars // 2, end)
+                end = space if space > 0 else end
+            chunks.append({"page": page_number, "text": text[start:end]})
+            if end == len(text):
+                break
+            start = max(end - overlap, start + 1)
+            # Start on a word boundary
+            space = text.find(' ', start, end)
+            start = space + 1 if space >= 0 else start
+    return chunks
+
+
+class ChunkIndex:
+    '''
+    Exact inner-product FAISS index over the normalized chunk embeddings of one document.
+    Chunks are encoded directly rather than through the persistent embedding cache, which would otherwise keep
+    the text of every PDF ever discussed; the built indexes themselves are kept in a bounded in-memory cache.
+    '''
+
+    def __init__(self, pages: list[str]) -> None:
+        self.chunks = split_pages(pages)
+        self.index = faiss.IndexFlatIP(embedding.dimension())
+        if self.chunks:
+            vectors = embedding.encode([chunk["text"] for chunk in self.chunks])
+            self.index.add(self._normalize(vectors))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, k: int = CHUNK_TOP_K) -> list[dict]:
+        '''
+        Return the k chunks most similar to the query, in document order, each with its score
+        '''
+        if not self.chunks:
+            return []
+        vector = self._normalize(embedding.encode_query(query))
+        scores, indices = self.index.search(vector, min(k, len(self.chunks)))
+        hits = sorted((i, score) for i, score in zip(indices[0], scores[0]) if i >= 0)
+        return [dict(self.chunks[i], score=float(score)) for i, score in hits]
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, embedding.dimension())
+        faiss.normalize_L2(vectors)
+        return vectors
+
+
+def get_index(doc_id: str, pages: list[str]) -> ChunkIndex:
+    '''
+    Return the chunk index of a document, building it on first use
+    '''
+    index = _indexes.get(doc_id)
+    if index is None:
+        index = ChunkIndex(pages)
+        _indexes.set(doc_id, index)
+    return index
+
+
+def stats() -> dict:
+    return _indexes.stats()
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+from cache import Cache
+from document_store import ARXIV_URL_PATTERN, ARXIV_VERSION_PATTERN
+
+# Semantic Scholar Graph API, or a stub server standing in for it (see github-frontend/flask-test)
+SEMANTIC_SCHOLAR_URL = os.getenv("SEMANTIC_SCHOLAR_URL", "https://api.semanticscholar.org/graph/v1")
+# Largest number of ids paper/batch accepts in one request
+BATCH_LIMIT = 500
+# Papers Semantic Scholar does not know yet are looked up again after this many seconds
+NOT_FOUND_TTL = 3600
+
+
+def arxiv_id_from_url(url: str):
+    '''
+    Unversioned arXiv id of an arXiv URL, such as 2106.09685 or hep-th/9901001, or None
+    '''
+    match = ARXIV_URL_PATTERN.search(url)
+    return ARXIV_VERSION_PATTERN.sub('', match.group(1)) if match else None
+
+
+class CitationCounts:
+    '''
+    Citation counts of arXiv papers, served from the cache first. The misses of a call are resolved with
+    one Semantic Scholar paper/batch request per BATCH_LIMIT ids, and ids that a concurrent call is already
+    fetching are awaited instead of requested again, across threads and event loops.
+    ---------------------------------
+    cache: Cache of counts by arXiv id, its TTL decides how fresh counts are
+    base_url: Semantic Scholar Graph API root
+    api_key: optional Semantic Scholar API key
+    '''
+
+    def __init__(self, cache: Cache, base_url: str = SEMANTIC_SCHOLAR_URL, api_key: str = None) -> None:
+        self.cache = cache
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+
+    async def get_many(self, client, arxiv_ids: list[str]) -> dict:
+        '''
+        Return the citation count of every id, None when it could not be fetched
+        ---------------------------------
+        client: httpx.AsyncClient of the running event loop
+        '''
+        counts = {}
+        missing = []
+        for arxiv_id in dict.fromkeys(arxiv_ids):
+            count = self.cache.get(arxiv_id)
+            if count is not None:
+                counts[arxiv_id] = count
+            else:
+                missing.append(arxiv_id)
+
+        owned, pending = [], {}
+        with self._lock:
+            for arxiv_id in missing:
+                future = self._inflight.get(arxiv_id)
+                if future is None:
+                    future = self._inflight[arxiv_id] = Future()
+                    owned.append(arxiv_id)
+                else:
+                    self.coalesced += 1
+                pending[arxiv_id] = future
+
+        if owned:
+            fetched = {}
+            try:
+                fetched = await self._fetch(client, owned)
+            except Exception as e:
+                print(f"Error fetching citation counts: {str(e)}")
+            finally:
+                # Also runs on cancellation, which propagates here after the coalesced callers are woken
+                with self._lock:
+                    for arxiv_id in owned:
+                        del self._inflight[arxiv_id]
+                for arxiv_id in owned:
+                    pending[arxiv_id].set_result(fetched.get(arxiv_id))
+
+        for arxiv_id, future in pending.items():
+            counts[arxiv_id] = await asyncio.wrap_future(future)
+        return counts
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+    async def _fetch(self, client, arxiv_ids: list[str]) -> dict:
+        # Unknown papers count as 0 for a shorter time; failed requests are not cached
+        headers = {"x-api-key": self.api_key} if self.api_key else {}
+        counts = {}
+        for i in range(0, len(arxiv_ids), BATCH_LIMIT):
+            chunk = arxiv_ids[i:i + BATCH_LIMIT]
+            self.requests += 1
+            response = await client.post(f"{self.base_url}/paper/batch", params={"fields": "citationCount"},
+                                         json={"ids": [f"arXiv:{arxiv_id}" for arxiv_id in chunk]}, headers=headers)
+            response.raise_for_status()
+            for arxiv_id, paper in zip(chunk, response.json()):
+                if paper is None:
+                    counts[arxiv_id] = 0
+                    self.cache.set(arxiv_id, 0, ttl=NOT_FOUND_TTL)
+                else:
+                    counts[arxiv_id] = paper.get('citationCount') or 0
+                    self.cache.set(arxiv_id, counts[arxiv_id])
+        return counts
@@ -1,19 +1,52 @@
 import arxiv
+import os
 from pinecone import Pinecone, ServerlessSpec
 import time
 import datetime
 import json
-from typing import Union
+from typing import Iterable, Iterator, Union
+
+import embedding
+from batching import MicroBatcher
+from cache import Cache
 
 API_KEY = "YOUR_API_KEY"
 EMB_MODEL = 'multilingual-e5-large'
 RERANK_MODEL = "bge-reranker-v2-m3"
+# Suffix of the offset index written next to an exported local database
+INDEX_SUFFIX = '.idx'
+# Default local database file, and the JSON file written by earlier versions, read when it is the only one present
+LOCAL_DATABASE_PATH = r'./articles_db.jsonl'
+LEGACY_LOCAL_DATABASE_PATH = r'./articles_db.json'
 
 pc = Pinecone(api_key=API_KEY)
 index = pc.Index('index')
 
 
+def _embed_queries(queries: list[str]) -> list[list[float]]:
+    unique = list(dict.fromkeys(queries))
+    embeddings = pc.inference.embed(
+        model=EMB_MODEL,
+        inputs=unique,
+        parameters={
+            "input_type": "query"
+        }
+    )
+    vectors = {query: emb.values for query, emb in zip(unique, embeddings)}
+    return [vectors[query] for query in queries]
+
+
+# Query embeddings already computed, and concurrent searches grouped into one embed call
+query_cache = Cache(max_entries=int(os.getenv("QUERY_CACHE_SIZE", "4096")))
+query_batcher = MicroBatcher(_embed_queries, max_batch_size=int(os.getenv("QUERY_BATCH_SIZE", "64")),
+                             max_wait=float(os.getenv("QUERY_BATCH_WAIT_MS", "5")) / 1000,
+                             name="pinecone-query-batcher")
+
+
 class Paper:
+    # Fixed attributes instead of a per-instance __dict__, which dominates memory with many papers
+    __slots__ = ('id', 'url', 'title', 'summary', 'authors', 'date', 'citations')
+
     def __init__(self, url: str, title: str, summary: str, authors: list[str], date: datetime.date) -> None:
         self.id = url.split('/')[-1]
         self.url = url
@@ -35,11 +68,13 @@ class Paper:
 
     @staticmethod
     def from_metadata(metadata: dict) -> 'Paper':
-        paper = Paper(**metadata)
-        paper.authors = metadata['authors'].split(', ')
-        paper.date = datetime.date(
-            *([int(i) for i in metadata['date'].split('-')]))
-        return paper
+        return Paper(
+            url=metadata['url'],
+            title=metadata['title'],
+            summary=metadata['summary'],
+            authors=metadata['authors'].split(', '),
+            date=datetime.date.fromisoformat(metadata['date'])
+        )
 
     def __eq__(self, right: object) -> bool:
         if isinstance(right, Paper):
@@ -50,10 +85,13 @@ class Paper:
             raise ValueError('Cannot compare Paper with other data type.')
 
     def to_metadata(self) -> dict:
-        metadata = {k: str(v)
-                    for k, v in self.__dict__.items() if not k in ('id', 'authors', 'citations')}
-        metadata['authors'] = ', '.join(self.authors)
-        return metadata
+        return {
+            'url': self.url,
+            'title': self.title,
+            'summary': self.summary,
+            'date': str(self.date),
+            'authors': ', '.join(self.authors)
+        }
 
 
 def search_arxiv(query: str, max_results: int = 5) -> list[Paper]:
@@ -70,13 +108,14 @@ def search_arxiv(query: str, max_results: int = 5) -> list[Paper]:
     return [Paper.from_arxiv_result(result=result) for result in search.results()]
 
 
-def upsert_data(papers: list[Paper]):
+def embed_passages(texts: list[str]) -> tuple[list[list[float]], int]:
     '''
-    Upsert the papers to the database
+    Embed passages with the Pinecone inference API
+    Return the embeddings and the number of tokens billed
     '''
     embeddings = pc.inference.embed(
         model=EMB_MODEL,
-        inputs=[p.summary for p in papers],
+        inputs=texts,
         parameters={
             "input_type": "passage",
             "truncate": "END"
@@ -85,12 +124,21 @@ def upsert_data(papers: list[Paper]):
 
     print('Token usage for embedding: ',
           embeddings.usage['total_tokens'], sep='')
+    return [e["values"] for e in embeddings], embeddings.usage['total_tokens']
+
+
+def upsert_data(papers: list[Paper]):
+    '''
+    Upsert the papers to the database
+    Summaries embedded before are read from the embedding cache instead of being billed again
+    '''
+    embeddings = embedding.get_cache().embed(f"{EMB_MODEL}/passage", [p.summary for p in papers], embed_passages)
 
     records = []
     for p, e in zip(papers, embeddings):
         records.append({
             "id": p.id,
-            "values": e["values"],
+            "values": e.tolist(),
             "metadata": p.to_metadata()
         })
 
@@ -104,16 +152,14 @@ def search_database(query: str, max_results=5) -> list[Paper]:
     '''
     Search for papaers in the database
     '''
-    query_embedding = pc.inference.embed(
-        model=EMB_MODEL,
-        inputs=[query],
-        parameters={
-            "input_type": "query"
-        }
-    )
+    key = f"{EMB_MODEL}/query\n{query}"
+    query_embedding = query_cache.get(key)
+    if query_embedding is None:
+        query_embedding = query_batcher(query)
+        query_cache.set(key, query_embedding)
 
     results = index.query(
-        vector=query_embedding[0].values,
+        vector=query_embedding,
         top_k=max_results,
         include_values=False,
         include_metadata=True
@@ -126,6 +172,12 @@ def search_database(query: str, max_results=5) -> list[Paper]:
     return papers
 
 
+def query_stats() -> dict:
+    stats = query_cache.stats()
+    stats["batching"] = query_batcher.stats()
+    return stats
+
+
 def rerank_papers(query: str, papers: Union[list[Paper], list[object]], max_results: int =None, text_attr=lambda p: p.summary) -> Union[list[Paper], list[object]]:
     '''
     Rerank the papers based on the query
@@ -154,20 +206,98 @@ def rerank_papers(query: str, papers: Union[list[Paper], list[object]], max_resu
     return [papers[i] for i in reranked_index]
 
 
-def export_local_database(database: dict, path = r'./articles_db.json'):
+def export_local_database(database: Union[dict, Iterable[tuple[str, dict]]], path = LOCAL_DATABASE_PATH):
+    '''
+    Backup local database in a JSON Lines file, one [key, value] record per line.
+    An offset index by arXiv id is written next to it (path + '.idx') for random access.
+    ---------------------------------
+    database: dict of url -> article, or any iterable of (url, article) pairs.
+        Records are streamed one at a time, so a generator is exported in constant memory.
+    '''
+    if isinstance(database, dict):
+        database = database.items()
+    with open(path, 'wb') as f, open(path + INDEX_SUFFIX, 'w') as index_file:
+        offset = 0
+        for key, value in database:
+            line = json.dumps([key, value]).encode() + b'\n'
+            f.write(line)
+            index_file.write(f"{key.split('/')[-1]}\t{offset}\n")
+            offset += len(line)
+
+
+def iter_local_database(path = None) -> Iterator[tuple[str, dict]]:
+    '''
+    Stream (url, article) pairs from a local database file without reading it whole.
+    Files written by the previous JSON format are still accepted, but they are parsed in one piece,
+    so loading them needs memory for the whole database at once.
+    ---------------------------------
+    path: database file, by default LOCAL_DATABASE_PATH, or LEGACY_LOCAL_DATABASE_PATH if only that one exists
+    '''
+    if path is None:
+        path = LOCAL_DATABASE_PATH
+        if not os.path.exists(path) and os.path.exists(LEGACY_LOCAL_DATABASE_PATH):
+            path = LEGACY_LOCAL_DATABASE_PATH
+    with open(path, 'rb') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == b'{':
+            yield from json.load(f).items()
+            return
+        for line in f:
+            if line.strip():
+                key, value = json.loads(line)
+                yield key, value
+
+
+def load_local_database(path = None) -> dict:
     '''
-    Backup local database in JSON file.
+    Load local database into a dict, parsing one record at a time (legacy JSON files in one piece).
+    The default path falls back to the legacy file, as in iter_local_database.
     '''
-    with open(path, 'w') as f:
-        json.dump(database, f)
+    return dict(iter_local_database(path))
 
-def load_local_database(path = r'./articles_db.json'):
+
+class LocalDatabaseReader:
     '''
-    Load local JSON database.
+    Random access to an exported local database by arXiv id (the last part of the URL, see Paper.id).
+    Only the id -> offset index is kept in memory; records are read from disk on demand.
     '''
-    with open(path) as f: 
-        data = f.read()
-    return json.loads(data)
+
+    def __init__(self, path = LOCAL_DATABASE_PATH) -> None:
+        self.offsets = {}
+        with open(path + INDEX_SUFFIX) as index_file:
+            for line in index_file:
+                paper_id, offset = line.rstrip('\n').split('\t')
+                self.offsets[paper_id] = int(offset)
+        self.file = open(path, 'rb')
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return paper_id in self.offsets
+
+    def get(self, paper_id: str) -> Union[dict, None]:
+        '''
+        Return the article stored under the arXiv id, or None
+        '''
+        offset = self.offsets.get(paper_id)
+        if offset is None:
+            return None
+        self.file.seek(offset)
+        return json.loads(self.file.readline())[1]
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'LocalDatabaseReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
 
 def export_local_database_pinecone(database: dict):
     '''
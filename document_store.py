@@ -0,0 +1,132 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+
+from cache import SQLiteConnection
+
+# arXiv abstract or PDF URL; only a versioned id names immutable content
+ARXIV_URL_PATTERN = re.compile(r'arxiv\.org/(?:abs|pdf)/(.+?)(?:\.pdf)?/?$')
+ARXIV_VERSION_PATTERN = re.compile(r'v\d+$')
+
+
+def arxiv_doc_id(url: str):
+    '''
+    Document id of a versioned arXiv URL, known before downloading, or None
+    '''
+    match = ARXIV_URL_PATTERN.search(url)
+    if match and ARXIV_VERSION_PATTERN.search(match.group(1)):
+        return f"arxiv:{match.group(1)}"
+    return None
+
+
+def content_doc_id(content: bytes) -> str:
+    return f"sha256:{hashlib.sha256(content).hexdigest()}"
+
+
+def file_doc_id(path: str) -> str:
+    '''
+    Document id of a file, the same as content_doc_id of its bytes, read in blocks
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+
+class DocumentStore:
+    '''
+    Persistent store of the text extracted from documents, page by page, keyed by document id:
+    "arxiv:<id>v<version>" for versioned arXiv papers, "sha256:<hash>" of the file for anything else.
+    Pages are stored as zlib-compressed JSON in a SQLite file; once the compressed size exceeds max_bytes,
+    the least recently used documents are evicted first.
+    ---------------------------------
+    path: SQLite file, None to keep the store in memory only; may be shared by several processes
+    max_bytes: bound on the compressed size of all documents
+    level: zlib compression level
+    '''
+
+    def __init__(self, path: str = None, max_bytes: int = 256 * 2 ** 20, level: int = 6) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._connection = SQLiteConnection(path)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, data BLOB NOT NULL, "
+            "raw_bytes INTEGER NOT NULL, stored_bytes INTEGER NOT NULL, last_access REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS documents_last_access ON documents (last_access)")
+        db.commit()
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def get(self, doc_id: str):
+        '''
+        Return the pages of the document, or None
+        '''
+        with self._lock:
+            db = self._connection()
+            row = db.execute("SELECT data FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE documents SET last_access = ? WHERE doc_id = ?", (time.time(), doc_id))
+            db.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, doc_id: str, pages: list[str]) -> None:
+        raw = json.dumps(pages).encode()
+        data = zlib.compress(raw, self.level)
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, data, raw_bytes, stored_bytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?)", (doc_id, data, len(raw), len(data), time.time()))
+            self._evict(db)
+            db.commit()
+
+    def stats(self) -> dict:
+        '''
+        Hit/miss counters, number of documents, and their size before and after compression
+        '''
+        with self._lock:
+            documents, raw_bytes, stored_bytes = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(stored_bytes), 0) FROM documents").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "documents": documents,
+                "raw_bytes": raw_bytes,
+                "bytes": stored_bytes,
+                "max_bytes": self.max_bytes,
+                "compression_ratio": raw_bytes / stored_bytes if stored_bytes else 0.0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _evict(self, db) -> None:
+        size = db.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM documents").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        # Keep at least the most recent document, even if it alone exceeds the bound
+        rows = db.execute("SELECT doc_id, stored_bytes FROM documents ORDER BY last_access").fetchall()[:-1]
+        evicted = []
+        for doc_id, stored_bytes in rows:
+            if size <= self.max_bytes:
+                break
+            evicted.append((doc_id,))
+            size -= stored_bytes
+        db.executemany("DELETE FROM documents WHERE doc_id = ?", evicted)
+        self.evictions += len(evicted)
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from batching import MicroBatcher
+from cache import Cache
+from embedding_cache import EmbeddingCache
+
+# Sentence embedding model used for the local vector store
+MODEL_NAME = "paraphrase-MiniLM-L6-v2"
+
+# Output dimension of common sentence-transformers models, so the store can open without loading the model
+KNOWN_DIMENSIONS = {
+    "paraphrase-MiniLM-L6-v2": 384,
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "all-mpnet-base-v2": 768,
+    "multi-qa-mpnet-base-dot-v1": 768
+}
+
+_model = None
+_model_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+# LRU of query embeddings, and the batcher grouping the concurrent query encodes into one forward pass
+_query_cache = Cache(max_entries=int(os.getenv("QUERY_CACHE_SIZE", "4096")))
+_query_batcher = None
+_query_batcher_lock = threading.Lock()
+_state = {"state": "not_loaded", "error": None, "load_seconds": None}
+
+
+def model_name() -> str:
+    return os.getenv("EMBEDDING_MODEL", MODEL_NAME)
+
+
+def dimension() -> int:
+    '''
+    Embedding dimension without loading the model: from EMBEDDING_DIM, the table of known models, or
+    the pooling config in the local Hugging Face cache. Only loads the model when none of these is available.
+    '''
+    if os.getenv("EMBEDDING_DIM"):
+        return int(os.getenv("EMBEDDING_DIM"))
+    name = model_name()
+    if name in KNOWN_DIMENSIONS:
+        return KNOWN_DIMENSIONS[name]
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        repo_id = name if '/' in name else f"sentence-transformers/{name}"
+        config_path = try_to_load_from_cache(repo_id, "1_Pooling/config.json")
+        if isinstance(config_path, str):
+            with open(config_path) as f:
+                return json.load(f)["word_embedding_dimension"]
+    except (ImportError, OSError, KeyError, ValueError):
+        pass
+    return get_model().get_sentence_embedding_dimension()
+
+
+def get_model():
+    '''
+    Return the SentenceTransformer model, loading it on first use.
+    torch and sentence_transformers are only imported here, so importing the app stays fast.
+    '''
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _state["state"] = "loading"
+                start = time.perf_counter()
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(model_name())
+                    # The first forward pass initializes the kernels, keep it out of the first request
+                    model.encode(["warm-up"])
+                except Exception as e:
+                    _state.update(state="failed", error=str(e))
+                    raise
+                _state.update(state="ready", error=None, load_seconds=time.perf_counter() - start)
+                _model = model
+    return _model
+
+
+def encode(texts, **kwargs):
+    return get_model().encode(texts, **kwargs)
+
+
+def get_cache() -> EmbeddingCache:
+    '''
+    Return the process-wide embedding cache, stored in EMBEDDING_CACHE_PATH (empty to keep it in memory)
+    as EMBEDDING_CACHE_DTYPE vectors
+    '''
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(path=os.getenv("EMBEDDING_CACHE_PATH", "./embeddings.sqlite") or None,
+                                        dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"))
+    return _cache
+
+
+def encode_cached(texts, **kwargs):
+    '''
+    Encode texts with the local model, reusing the cached embeddings of texts seen before
+    '''
+    return get_cache().embed(model_name(), texts, lambda missing: (encode(missing, **kwargs), None))
+
+
+def _encode_batch(texts):
+    # Equal queries sent at the same time are encoded once
+    unique = list(dict.fromkeys(texts))
+    vectors = dict(zip(unique, encode(unique)))
+    return [vectors[text] for text in texts]
+
+
+def get_query_batcher() -> MicroBatcher:
+    '''
+    Return the batcher of query encodes, waiting QUERY_BATCH_WAIT_MS for concurrent queries to join a batch
+    of at most QUERY_BATCH_SIZE
+    '''
+    global _query_batcher
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = MicroBatcher(_encode_batch,
+                                              max_batch_size=int(os.getenv("QUERY_BATCH_SIZE", "64")),
+                                              max_wait=float(os.getenv("QUERY_BATCH_WAIT_MS", "5")) / 1000,
+                                              name="query-batcher")
+    return _query_batcher
+
+
+def submit_query(query: str) -> Future:
+    '''
+    Return a future of the query embedding, resolved at once from the query cache, else by the batcher
+    '''
+    key = f"{model_name()}\n{query}"
+    vector = _query_cache.get(key)
+    if vector is not None:
+        future = Future()
+        future.set_result(vector)
+        return future
+    def store(done):
+        if done.exception() is None:
+            _query_cache.set(key, done.result())
+
+    future = get_query_batcher().submit(query)
+    future.add_done_callback(store)
+    return future
+
+
+def encode_query(query: str):
+    return submit_query(query).result()
+
+
+async def encode_query_async(query: str):
+    return await asyncio.wrap_future(submit_query(query))
+
+
+def query_stats() -> dict:
+    stats = _query_cache.stats()
+    stats["batching"] = get_query_batcher().stats()
+    return stats
+
+
+def is_ready() -> bool:
+    return _model is not None
+
+
+def status() -> dict:
+    return dict(_state, model=model_name())
+
+
+def start_warmup(mode: str = None) -> None:
+    '''
+    Load the model according to EMBEDDING_WARMUP: "background" (default) in a daemon thread so the server
+    answers immediately, "eager" before returning, as needed before forking workers, or "lazy" on first use
+    '''
+    mode = mode or os.getenv("EMBEDDING_WARMUP", "background")
+    if mode == "eager":
+        get_model()
+    elif mode == "background":
+        def warmup():
+            try:
+                get_model()
+            except Exception as e:
+                print(f"Error loading embedding model: {str(e)}")
+
+        threading.Thread(target=warmup, name="embedding-warmup", daemon=True).start()
+    elif mode != "lazy":
+        raise ValueError(f'Unknown EMBEDDING_WARMUP mode: {mode}. Expected background, eager or lazy.')
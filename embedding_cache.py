@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+from cache import SQLiteConnection
+
+DTYPES = ('float32', 'float16')
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    '''
+    Persistent cache of text embeddings keyed by (model name, SHA-256 of the text), stored in a SQLite file
+    as raw float32 or float16 arrays. Every entry keeps what computing it cost, the API tokens billed and
+    the encoding time, so hits report the tokens and CPU time they saved.
+    ---------------------------------
+    path: SQLite file, None to keep the cache in memory only; may be shared by several processes
+    dtype: storage type of the vectors, float16 halves the size at a small precision loss
+    '''
+
+    def __init__(self, path: str = None, dtype: str = 'float32') -> None:
+        if dtype not in DTYPES:
+            raise ValueError(f'Unknown embedding cache dtype: {dtype}. Expected one of {", ".join(DTYPES)}.')
+        self.path = path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._connection = SQLiteConnection(path)
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.seconds_saved = 0.0
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, hash TEXT NOT NULL, dtype TEXT NOT NULL, "
+            "vector BLOB NOT NULL, tokens INTEGER, seconds REAL, PRIMARY KEY (model, hash))")
+        db.commit()
+
+    def embed(self, model: str, texts: list[str], compute) -> np.ndarray:
+        '''
+        Return the float32 embeddings of texts, one row per text, computing only the uncached ones.
+        compute(texts) must return (embeddings, tokens), tokens being the API tokens billed for the call or None
+        ---------------------------------
+        model: name of the model and of anything else the embedding depends on, such as the input type
+        '''
+        hashes = [text_hash(text) for text in texts]
+        found = self.get_many(model, hashes)
+
+        missing = {}
+        for text, key in zip(texts, hashes):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            start = time.perf_counter()
+            vectors, tokens = compute(list(missing.values()))
+            seconds = time.perf_counter() - start
+            vectors = np.asarray(vectors, dtype=np.float32)
+            # Split the cost of the call between its texts by length
+            lengths = np.array([len(text) for text in missing.values()], dtype=np.float64)
+            shares = lengths / lengths.sum() if lengths.sum() else np.full(len(lengths), 1 / len(lengths))
+            self.put_many(model, list(missing), vectors,
+                          tokens=None if tokens is None else [round(tokens * share) for share in shares],
+                          seconds=[seconds * share for share in shares])
+            found.update(zip(missing, vectors))
+
+        with self._lock:
+            self.misses += len(missing)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in hashes])
+
+    def get_many(self, model: str, hashes: list[str]) -> dict:
+        '''
+        Return the cached float32 vectors of the given text hashes, keyed by hash, and count the hits
+        '''
+        found = {}
+        tokens_saved = 0
+        seconds_saved = 0.0
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            db = self._connection()
+            # Stay below the SQLite limit on query parameters
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = db.execute(
+                    f"SELECT hash, dtype, vector, tokens, seconds FROM embeddings "
+                    f"WHERE model = ? AND hash IN ({', '.join('?' * len(chunk))})", [model] + chunk).fetchall()
+                for key, dtype, vector, tokens, seconds in rows:
+                    found[key] = np.frombuffer(vector, dtype=dtype).astype(np.float32)
+                    tokens_saved += tokens or 0
+                    seconds_saved += seconds or 0.0
+            self.hits += len(found)
+            self.tokens_saved += tokens_saved
+            self.seconds_saved += seconds_saved
+        return found
+
+    def put_many(self, model: str, hashes: list[str], vectors: np.ndarray, tokens: list[int] = None,
+                 seconds: list[float] = None) -> None:
+        vectors = np.asarray(vectors).astype(self.dtype)
+        rows = [
+            (model, key, self.dtype, vector.tobytes(),
+             None if tokens is None else tokens[i], None if seconds is None else seconds[i])
+            for i, (key, vector) in enumerate(zip(hashes, vectors))
+        ]
+        with self._lock:
+            db = self._connection()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, dtype, vector, tokens, seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.commit()
+
+    def stats(self) -> dict:
+        '''
+        Hit/miss counters, size, and the API tokens and encoding time saved by the hits
+        '''
+        with self._lock:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "dtype": self.dtype,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "seconds_saved": self.seconds_saved
+            }
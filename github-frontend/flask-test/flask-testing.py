@@ -3,6 +3,9 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import json
 import os
+import re
+import time
+import zlib
 
 app = Flask(__name__)
 CORS(app)
@@ -60,5 +63,43 @@ def chat():
     print(f'Chatting with query: {query}')
     return jsonify({'response': 'Testing backend chat response for: ' + query})
 
+# Stand-in for the Semantic Scholar Graph API: start the backend with
+# SEMANTIC_SCHOLAR_URL=http://127.0.0.1:5000/graph/v1 to use it instead of the real service.
+# Citation counts are derived from the arXiv id, ids that do not look like arXiv ids are unknown,
+# and STUB_LATENCY seconds are added to every request.
+semantic_scholar_requests = {'single': 0, 'batch': 0, 'ids': 0}
+
+
+def stub_paper(paper_id):
+    arxiv_id = paper_id.removeprefix('arXiv:')
+    if not re.fullmatch(r'\d{4}\.\d{4,5}|[a-z.-]+/\d{7}', arxiv_id):
+        return None
+    return {'paperId': f'stub-{arxiv_id}', 'citationCount': zlib.crc32(arxiv_id.encode()) % 5000}
+
+
+@app.route('/graph/v1/paper/batch', methods=['POST'])
+def semantic_scholar_batch():
+    time.sleep(float(os.getenv('STUB_LATENCY', '0')))
+    ids = request.json.get('ids', [])
+    if len(ids) > 500:
+        return jsonify({'error': 'Cannot process more than 500 ids'}), 400
+    semantic_scholar_requests['batch'] += 1
+    semantic_scholar_requests['ids'] += len(ids)
+    return jsonify([stub_paper(paper_id) for paper_id in ids])
+
+@app.route('/graph/v1/paper/<path:paper_id>', methods=['GET'])
+def semantic_scholar_paper(paper_id):
+    time.sleep(float(os.getenv('STUB_LATENCY', '0')))
+    semantic_scholar_requests['single'] += 1
+    semantic_scholar_requests['ids'] += 1
+    paper = stub_paper(paper_id)
+    if paper is None:
+        return jsonify({'error': 'Paper not found'}), 404
+    return jsonify(paper)
+
+@app.route('/graph/v1/stats', methods=['GET'])
+def semantic_scholar_stats():
+    return jsonify(semantic_scholar_requests)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -112,13 +112,22 @@ export const searchAPI = async (query, originalQuery) => {
         processed_data.push(paper);
     }
     
+    // Fetch the citation counts of all papers, and the dates of those without one, in one request each
+    const paperUrls = processed_data.filter(paper => paper["url"] && paper["url"] !== "N/A").map(paper => paper["url"]);
+    const [citationCounts, papersMetadata] = await Promise.all([
+        getCitationCountsAPI(paperUrls),
+        getPaperMetadataBatchAPI(processed_data.filter(paper => paper["date"] === "Loading..." && paperUrls.includes(paper["url"])).map(paper => paper["url"]))
+    ]);
+
     // Fetch real metadata (dates and citations) in parallel
     const metadataPromises = processed_data
         .filter(paper => paper["url"] && paper["url"] !== "N/A")
         .map(async (paper) => {
             try {
-                // Get citation count
-                const citationCount = await getRealCitationCountAPI(paper["url"]);
+                // Get citation count, one by one only if the batch request failed
+                const citationCount = citationCounts !== null
+                    ? citationCounts[paper["url"]] ?? null
+                    : await getRealCitationCountAPI(paper["url"]);
                 
                 // If citation count is 0, generate a random number between 35 and 500
                 if (citationCount === 0) {
@@ -129,7 +138,9 @@ export const searchAPI = async (query, originalQuery) => {
                 
                 // Get publication date if not already set
                 if (paper["date"] === "Loading...") {
-                    const metadata = await getPaperMetadataAPI(paper["url"]);
+                    const metadata = papersMetadata !== null
+                        ? papersMetadata[paper["url"]]
+                        : await getPaperMetadataAPI(paper["url"]);
                     if (metadata && metadata.publication_date) {
                         paper["date"] = metadata.publication_date;
                     } else {
@@ -281,7 +292,7 @@ export const generateSurveyAPI = async (selected_articles) => {
 }
 
 // Update the chatAPI function to include user understanding
-export const chatAPI = async (query, papers = null, pdfContent = null, userUnderstanding = null) => {
+export const chatAPI = async (query, papers = null, pdfContent = null, userUnderstanding = null, pdfDocId = null, pdfUrl = null) => {
   const message = {
     query: query,
     selected_papers: papers,
@@ -289,6 +300,12 @@ export const chatAPI = async (query, papers = null, pdfContent = null, userUnder
     user_understanding: userUnderstanding
   };
 
+  // Reference the PDF text cached by the backend instead of sending it on every turn
+  if (pdfDocId) {
+    delete message.pdf_text_content;
+    message.pdf_doc_id = pdfDocId;
+  }
+
   // Check if this is a literature survey request
   const isLiteratureSurvey = query.toLowerCase().includes('survey') || 
                             query.toLowerCase().includes('literature') ||
@@ -303,6 +320,24 @@ export const chatAPI = async (query, papers = null, pdfContent = null, userUnder
     const response = await axios.post(apiUrl + "chat", message);
     return response.data.response;
   } catch (error) {
+    // The backend evicted the cached PDF text: extract the PDF again, which stores it under the same id,
+    // or send the text inline if that fails, and retry once
+    if (message.pdf_doc_id && error.response && error.response.status === 404) {
+      const extracted = pdfUrl ? await extractPdfTextAPI(pdfUrl) : null;
+      if (extracted && extracted.doc_id) {
+        message.pdf_doc_id = extracted.doc_id;
+      } else {
+        delete message.pdf_doc_id;
+        message.pdf_text_content = pdfContent;
+      }
+      try {
+        const response = await axios.post(apiUrl + "chat", message);
+        return response.data.response;
+      } catch (retryError) {
+        console.error("Error in chat API:", retryError);
+        throw retryError;
+      }
+    }
     console.error("Error in chat API:", error);
     throw error;
   }
@@ -404,6 +439,7 @@ export const comparePapersAPI = async (articles, query = null) => {
 }
 
 // Extract text from PDF through backend API
+// Returns { text_content, doc_id }, doc_id references the cached text in chatAPI
 export const extractPdfTextAPI = async (pdfUrl) => {
     try {
         const response = await axios.post(apiUrl + "extract-pdf-text", {
@@ -416,7 +452,7 @@ export const extractPdfTextAPI = async (pdfUrl) => {
             return null;
         }
         
-        return raw_data.text_content;
+        return raw_data;
     } catch (error) {
         console.error("Error extracting PDF text:", error);
         return null;
@@ -525,6 +561,23 @@ export const getRealCitationCountAPI = async (paperId) => {
   }
 };
 
+// Get real citation counts for many papers at once, keyed by paper URL
+export const getCitationCountsAPI = async (paperIds) => {
+  if (paperIds.length === 0) {
+    return {};
+  }
+  try {
+    const response = await axios.post(apiUrl + "get-citation-counts", {
+      paper_ids: paperIds
+    });
+
+    return response.data.citation_counts;
+  } catch (error) {
+    console.error("Error getting citation counts:", error);
+    return null;
+  }
+};
+
 // Get real publication date for a paper
 export const getPaperMetadataAPI = async (paperId) => {
   try {
@@ -537,4 +590,21 @@ export const getPaperMetadataAPI = async (paperId) => {
     console.error("Error getting paper metadata:", error);
     return null;
   }
-};
\ No newline at end of file
+};
+
+// Get real publication dates for many papers at once, keyed by paper URL
+export const getPaperMetadataBatchAPI = async (paperIds) => {
+  if (paperIds.length === 0) {
+    return {};
+  }
+  try {
+    const response = await axios.post(apiUrl + "get-paper-metadata-batch", {
+      paper_ids: paperIds
+    });
+
+    return response.data.metadata;
+  } catch (error) {
+    console.error("Error getting paper metadata:", error);
+    return null;
+  }
+};
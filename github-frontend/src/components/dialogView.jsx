@@ -65,6 +65,7 @@ export default function DialogView({
   const [useAugSearch, setUserAugSearch] = useState(false);
   const [isWideLayout, setIsWideLayout] = useState(false);
   const [pdfTextContent, setPdfTextContent] = useState(null);
+  const [pdfDocId, setPdfDocId] = useState(null);
   const [isExtractingText, setIsExtractingText] = useState(false);
   const pdfIframeRef = useRef(null);
   const [showFeedbackUI, setShowFeedbackUI] = useState(false);
@@ -213,9 +214,11 @@ export default function DialogView({
       try {
         setIsExtractingText(true);
         console.log("Extracting text from PDF...");
-        const text = await extractPdfTextAPI(pdfUrl);
+        const extracted = await extractPdfTextAPI(pdfUrl);
+        const text = extracted ? extracted.text_content : null;
         console.log("PDF text extracted:", text ? text.substring(0, 100) + "..." : "No text extracted");
         setPdfTextContent(text);
+        setPdfDocId(extracted ? extracted.doc_id : null);
       } catch (error) {
         console.error("Error extracting PDF text:", error);
       } finally {
@@ -224,6 +227,7 @@ export default function DialogView({
     } else {
       console.log("No valid PDF URL to extract from");
       setPdfTextContent(null);
+      setPdfDocId(null);
     }
   };
 
@@ -239,7 +243,7 @@ export default function DialogView({
   }, [pdfTextContent]);
 
   // Add this function to handle getting AI responses
-  const getAIResponse = async (userMessage, selectedPapers, pdfContent, understanding) => {
+  const getAIResponse = async (userMessage, selectedPapers, pdfContent, understanding, docId = null) => {
     console.log("Getting AI response with:", {
       message: userMessage,
       papers: selectedPapers ? selectedPapers.length : 0,
@@ -252,7 +256,9 @@ export default function DialogView({
       userMessage, 
       selectedPapers,
       pdfContent,
-      understanding
+      understanding,
+      docId,
+      pdfUrl && isPdfUrl(pdfUrl) ? pdfUrl : null // To extract the PDF again if the backend evicted its text
     );
     
     console.log("AI response received");
@@ -290,7 +296,8 @@ export default function DialogView({
         userMessage, 
         selectedPapers,
         pdfTextContent, // Pass the PDF content directly
-        userUnderstanding
+        userUnderstanding,
+        pdfDocId // Sent instead of the content when the backend cached it
       );
       
       // Add AI response to dialog
@@ -0,0 +1,19 @@
+"""
+Multi-process deployment: gunicorn -c gunicorn.conf.py main:app
+
+The app is loaded once before the workers are forked, so they share the pages of the embedding model
+and of the memory-mapped vector store snapshot instead of loading one copy each. The workers share the
+persisted store in VECTOR_STORE_PATH and, with CACHE_PATH set, the SQLite tier of the caches.
+For async views on the event loop, use GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker with asgi:app.
+"""
+import os
+
+# Load the model before forking, a half-loaded model must not be copied into the workers
+os.environ.setdefault("EMBEDDING_WARMUP", "eager")
+
+bind = os.getenv("BIND", "127.0.0.1:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+preload_app = True
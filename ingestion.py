@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+
+from batching import MicroBatcher
+
+
+class IngestionQueue:
+    '''
+    Background ingestion of articles: submit() returns at once, and a worker thread gathers the pending
+    articles into batches of up to batch_size, waiting at most max_wait seconds for a batch to fill,
+    and passes each batch to ingest(articles), which embeds, dedups and indexes them.
+    flush() waits until every article submitted before the call is indexed, for read-after-write.
+    ---------------------------------
+    ingest: batch function, called from the worker thread, returning the number of articles added
+    batch_size: largest number of articles per call of ingest
+    max_wait: seconds to wait for more articles once the first one of a batch arrived
+    max_pending: bound of the queue, submit() blocks while it is full so ingestion keeps up with the searches
+    '''
+
+    def __init__(self, ingest, batch_size: int = 64, max_wait: float = 0.1, max_pending: int = 10000,
+                 name: str = 'ingestion') -> None:
+        self.ingest = ingest
+        # Batches are gathered by a MicroBatcher, whose items are (submission time, article) pairs
+        self._batcher = MicroBatcher(self._ingest_batch, max_batch_size=batch_size, max_wait=max_wait, name=name,
+                                     max_pending=max_pending)
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._pid = os.getpid()
+        self._submitted = 0
+        self._processed = 0
+        self.added = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.last_lag = None
+        self.last_error = None
+
+    def submit(self, articles: list[dict]) -> None:
+        self._after_fork()
+        for article in articles:
+            # Counted before it is queued, so flush() never misses an article the worker already took
+            with self._lock:
+                self._submitted += 1
+            self._batcher.submit((time.monotonic(), article))
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until the articles submitted so far are ingested, return False on timeout
+        '''
+        self._after_fork()
+        with self._done:
+            target = self._submitted
+            return self._done.wait_for(lambda: self._processed >= target, timeout=timeout)
+
+    def stats(self) -> dict:
+        '''
+        Queue depth, lag of the oldest pending article and of the last batch, and ingestion throughput
+        '''
+        oldest = self._batcher.oldest()
+        with self._lock:
+            return {
+                "depth": self._submitted - self._processed,
+                "submitted": self._submitted,
+                "processed": self._processed,
+                "added": self.added,
+                "batches": self.batches,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "oldest_pending_ms": None if oldest is None else (time.monotonic() - oldest[0]) * 1000,
+                "last_batch_lag_ms": None if self.last_lag is None else self.last_lag * 1000,
+                "articles_per_second": self._processed / self.busy_seconds if self.busy_seconds else 0.0
+            }
+
+    def _after_fork(self) -> None:
+        # A forked worker process does not ingest the articles its parent had pending, so it stops waiting for them
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._done = threading.Condition(self._lock)
+            self._submitted = self._processed
+            self._pid = os.getpid()
+
+    def _ingest_batch(self, batch: list[tuple]) -> list:
+        start = time.monotonic()
+        added, error = 0, None
+        try:
+            added = self.ingest([article for _, article in batch])
+        except Exception as e:
+            print(f"Error ingesting {len(batch)} articles: {str(e)}")
+            error = str(e)
+        end = time.monotonic()
+        with self._done:
+            self._processed += len(batch)
+            self.batches += 1
+            self.added += added or 0
+            self.busy_seconds += end - start
+            self.last_lag = end - batch[0][0]
+            if error is not None:
+                self.errors += 1
+                self.last_error = error
+            self._done.notify_all()
+        return [None] * len(batch)
@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+import weakref
+
+from typing import TYPE_CHECKING
+
+import httpx
+
+from metrics import Metrics
+
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+
+BASE_URL = "https://api.gptsapi.net/v1"
+
+# Latency and token usage of every LLM call, by caller
+metrics = Metrics()
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+# Event loops that serve many requests, such as the server loop of asgi.py, see share_loop
+_shared_loops = weakref.WeakSet()
+
+
+def _client_settings() -> dict:
+    max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    return {
+        "base_url": os.getenv("OPENAI_BASE_URL", BASE_URL),
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "timeout": httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", "120")),
+                                 connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))),
+        "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                               keepalive_expiry=60)
+    }
+
+
+def get_client() -> 'OpenAI':
+    '''
+    Return the process-wide OpenAI client, created on first use.
+    The client keeps a keep-alive connection pool, so consecutive calls reuse TCP and TLS sessions;
+    failed calls are retried by the SDK with exponential backoff.
+    Settings are read from the environment when the client is created:
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT, OPENAI_MAX_RETRIES
+    and OPENAI_MAX_CONNECTIONS.
+    '''
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # openai is imported on first use, it is slow to import and not needed to start the app
+                from openai import OpenAI, DefaultHttpxClient
+                settings = _client_settings()
+                _client = OpenAI(http_client=DefaultHttpxClient(limits=settings.pop("limits")), **settings)
+    return _client
+
+
+def share_loop(loop: asyncio.AbstractEventLoop) -> None:
+    '''
+    Mark an event loop as serving many requests, so async calls made on it use an AsyncOpenAI client of its own
+    '''
+    _shared_loops.add(loop)
+
+
+def get_async_client() -> 'AsyncOpenAI':
+    '''
+    Return the AsyncOpenAI client of the running event loop, created on first use, with the same settings
+    as get_client. httpx connection pools are bound to the loop that created them, so only loops marked
+    with share_loop get one: under asgi.py every async view runs on the server loop and all requests share it.
+    '''
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        settings = _client_settings()
+        client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=settings.pop("limits")), **settings)
+        _async_clients[loop] = client
+    return client
+
+
+def chat_completion(caller: str, **kwargs):
+    '''
+    Create a chat completion with the shared client and record its latency and token usage under caller
+    ---------------------------------
+    caller: name the call is reported under, usually the calling function or endpoint
+    kwargs: arguments of client.chat.completions.create
+    '''
+    start = time.perf_counter()
+    try:
+        response = get_client().chat.completions.create(**kwargs)
+    except Exception:
+        metrics.increment(f"{caller}.errors")
+        raise
+    metrics.observe(f"{caller}.latency_ms", (time.perf_counter() - start) * 1000)
+    if response.usage is not None:
+        metrics.observe(f"{caller}.prompt_tokens", response.usage.prompt_tokens)
+        metrics.observe(f"{caller}.completion_tokens", response.usage.completion_tokens)
+    return response
+
+
+async def chat_completion_async(caller: str, **kwargs):
+    '''
+    Awaitable chat_completion with the async client of the running loop, recorded under the same caller names
+    '''
+    loop = asyncio.get_running_loop()
+    if loop not in _shared_loops:
+        # Under app.run and gthread workers each request runs on a loop of its own, where a client would open
+        # a pool per request and leak it; the shared client keeps its keep-alive connections across requests
+        return await loop.run_in_executor(None, functools.partial(chat_completion, caller, **kwargs))
+    start = time.perf_counter()
+    try:
+        response = await get_async_client().chat.completions.create(**kwargs)
+    except Exception:
+        metrics.increment(f"{caller}.errors")
+        raise
+    metrics.observe(f"{caller}.latency_ms", (time.perf_counter() - start) * 1000)
+    if response.usage is not None:
+        metrics.observe(f"{caller}.prompt_tokens", response.usage.prompt_tokens)
+        metrics.observe(f"{caller}.completion_tokens", response.usage.completion_tokens)
+    return response
+
+
+def stream_chat_completion(caller: str, **kwargs):
+    '''
+    Stream a chat completion with the shared client, yielding the text deltas as they arrive.
+    Records the time to the first token separately from the total latency, under caller.
+    '''
+    start = time.perf_counter()
+    first_token = True
+    try:
+        with get_client().chat.completions.create(stream=True, stream_options={"include_usage": True},
+                                                  **kwargs) as stream:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    metrics.observe(f"{caller}.prompt_tokens", chunk.usage.prompt_tokens)
+                    metrics.observe(f"{caller}.completion_tokens", chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        metrics.observe(f"{caller}.first_token_ms", (time.perf_counter() - start) * 1000)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+    except Exception:
+        metrics.increment(f"{caller}.errors")
+        raise
+    metrics.observe(f"{caller}.latency_ms", (time.perf_counter() - start) * 1000)
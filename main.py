@@ -1,24 +1,62 @@
 import os
+import re
 import json
-import arxiv
-from openai import OpenAI
-import numpy as np
-from flask import Flask, request, jsonify
+import time
+import asyncio
+import threading
+import weakref
+import httpx
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import requests
-from io import BytesIO
-from PyPDF2 import PdfReader
-from sentence_transformers import SentenceTransformer
-import faiss
 import dotenv
 import hashlib
-from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, wait
 import database
-
-app = Flask(__name__)
+from vector_store import VectorStore
+from ingestion import IngestionQueue
+from document_store import DocumentStore, arxiv_doc_id, content_doc_id, file_doc_id
+from citations import CitationCounts, arxiv_id_from_url
+from cache import Cache
+from metrics import Metrics
+import embedding
+import llm
+import pdf_text
+import chunk_index
+
+
+class App(Flask):
+    def async_to_sync(self, func):
+        # Under app.run and gthread workers, asgiref runs each async view on a loop of its own that ends with
+        # the request, so the HTTP client opened on it is closed first. asgi.py awaits views on its server loop
+        # instead, where the client is kept for all requests
+        async def run_and_close(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                await close_http_client()
+
+        return super().async_to_sync(run_and_close)
+
+
+app = App(__name__)
 CORS(app)
 
+# Latency of every endpoint, reported by /metrics together with the LLM call statistics
+request_metrics = Metrics()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_start' in g and request.endpoint:
+        request_metrics.observe(f"{request.endpoint}.latency_ms", (time.perf_counter() - g.request_start) * 1000)
+    return response
+
 # Load environment variables from .env file
 dotenv.load_dotenv(dotenv_path=".env")
 
@@ -27,68 +65,181 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     print("Warning: OPENAI_API_KEY not found in environment variables. Please set it in the .env file.")
 
-# Initialize SentenceTransformer model for embeddings
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-
-# Get the actual embedding dimension from the model
-sample_text = "This is a sample text to determine the embedding dimension."
-embedding = model.encode([sample_text])[0]
-dim = embedding.shape[0]  # Get the actual dimension from the model
-
-# Initialize FAISS index for storing vectors with the correct dimension
-index = faiss.IndexFlatL2(dim)
+# Load the SentenceTransformer model in the background (EMBEDDING_WARMUP), /readyz reports when it is ready
+embedding.start_warmup()
+
+# The embedding dimension comes from the model config, so the store opens without waiting for the model
+dim = embedding.dimension()
+
+# Initialize the vector store with the correct dimension
+# VECTOR_INDEX_TYPE is one of flat, sq_fp16, sq8, pq, ivf_flat, ivf_pq or hnsw
+# With VECTOR_INDEX_RERANK, compressed indexes return VECTOR_INDEX_RERANK * k candidates reranked by exact distance
+# The store is persisted in VECTOR_STORE_PATH and reloaded memory-mapped on restart (empty to keep it in memory)
+# Worker processes sharing the directory see each other's rows within VECTOR_STORE_REFRESH_INTERVAL seconds
+vector_store = VectorStore(
+    dim,
+    index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+    train_size=int(os.getenv("VECTOR_INDEX_TRAIN_SIZE", "0")) or None,
+    nlist=int(os.getenv("VECTOR_INDEX_NLIST", "1024")),
+    pq_m=int(os.getenv("VECTOR_INDEX_PQ_M", "16")),
+    hnsw_m=int(os.getenv("VECTOR_INDEX_HNSW_M", "32")),
+    rerank_factor=int(os.getenv("VECTOR_INDEX_RERANK", "0")) or None,
+    path=os.getenv("VECTOR_STORE_PATH", "./vector_store") or None,
+    snapshot_every=int(os.getenv("VECTOR_STORE_SNAPSHOT_EVERY", "10000")),
+    refresh_interval=float(os.getenv("VECTOR_STORE_REFRESH_INTERVAL", "1"))
+)
+
+# Dictionary to store articles metadata, keyed by URL
+articles_db = vector_store.articles
+
+# Shared pool for concurrent arXiv lookups, bounded to stay within arXiv API rate limits
+ARXIV_MAX_WORKERS = int(os.getenv("ARXIV_MAX_WORKERS", "3"))
+arxiv_executor = ThreadPoolExecutor(max_workers=ARXIV_MAX_WORKERS, thread_name_prefix="arxiv")
+
+# Minimum spacing in seconds between the starts of two arXiv requests, across all threads of a process.
+# arXiv's API terms ask for at most one request every 3 seconds; with several worker processes, raise it accordingly
+ARXIV_REQUEST_INTERVAL = float(os.getenv("ARXIV_REQUEST_INTERVAL", "3"))
+arxiv_rate_lock = threading.Lock()
+arxiv_next_request = 0.0
+
+# New-style (2106.09685v2) and old-style (hep-th/9901001) arXiv identifiers
+ARXIV_ID_PATTERN = re.compile(r'\b(\d{4}\.\d{4,5}(v\d+)?|[a-z\-]+(\.[A-Z]{2})?/\d{7}(v\d+)?)\b')
+
+# Papers per arXiv id_list query of the metadata lookups, and papers per /get-paper-metadata-batch request
+ARXIV_ID_LIST_SIZE = int(os.getenv("ARXIV_ID_LIST_SIZE", "100"))
+MAX_METADATA_BATCH = int(os.getenv("MAX_METADATA_BATCH", "1000"))
+
+# Deadline in seconds shared by the related-paper lookups of one /search request
+RELATED_PAPERS_TIMEOUT = float(os.getenv("RELATED_PAPERS_TIMEOUT", "15"))
+
+# Number of abstracts encoded per forward pass when ingesting articles
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# How /chat puts the open PDF into the prompt: "chunks", the passages most relevant to the query, or "full"
+PDF_CONTEXT_MODE = os.getenv("PDF_CONTEXT_MODE", "chunks")
+
+# Timeout in seconds of the non-blocking HTTP client used by async views
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+http_clients = weakref.WeakKeyDictionary()
+
+# Helper function to create a cache for one namespace, configurable through <NAMESPACE>_CACHE_* variables
+def create_cache(namespace, max_entries, ttl, max_bytes=None):
+    prefix = namespace.upper()
+    max_bytes = os.getenv(f"{prefix}_CACHE_BYTES", max_bytes)
+    return Cache(
+        max_entries=int(os.getenv(f"{prefix}_CACHE_SIZE", max_entries)),
+        max_bytes=int(max_bytes) if max_bytes else None,
+        ttl=float(os.getenv(f"{prefix}_CACHE_TTL", ttl)),
+        path=os.getenv(f"{prefix}_CACHE_PATH") or os.getenv("CACHE_PATH") or None,
+        table=namespace
+    )
 
-# Dictionary to store articles metadata and embeddings
-articles_db = {}
 
-# Create a paper analysis cache
-paper_analysis_cache = {}
+# Caches by namespace: /search responses, paper analyses, citation counts, arXiv metadata and resolved titles
+search_cache = create_cache("search", max_entries=256, ttl=3600)
+analysis_cache = create_cache("analysis", max_entries=1000, ttl=7 * 24 * 3600, max_bytes=32 * 2 ** 20)
+citation_cache = create_cache("citation", max_entries=10000, ttl=24 * 3600)
+metadata_cache = create_cache("metadata", max_entries=10000, ttl=7 * 24 * 3600)
+title_cache = create_cache("title", max_entries=10000, ttl=7 * 24 * 3600)
+# Text extracted from PDFs, by arXiv id and version or content hash, compressed and bounded in size
+document_store = DocumentStore(path=os.getenv("DOCUMENT_STORE_PATH", "./documents.sqlite") or None,
+                               max_bytes=int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(256 * 2 ** 20))))
+caches = {
+    "search": search_cache,
+    "analysis": analysis_cache,
+    "citation": citation_cache,
+    "metadata": metadata_cache,
+    "title": title_cache
+}
+# Citation counts from Semantic Scholar, batched and coalesced, kept in the citation cache
+citation_counts = CitationCounts(citation_cache, api_key=os.getenv("SEMANTIC_SCHOLAR_API_KEY") or None)
+MAX_CITATION_BATCH = int(os.getenv("MAX_CITATION_BATCH", "1000"))
 
 
 # Helper function to generate a cache key for a paper
-def get_paper_cache_key(paper):
-    # Create a unique identifier based on title and authors
-    key_data = f"{paper.get('title', '')}-{paper.get('authors', '')}"
+def get_paper_cache_key(paper, query=None, model_name=None, variant="single"):
+    # Create a unique identifier based on title and authors, and on what the analysis depends on
+    key_data = f"{paper.get('title', '')}-{paper.get('authors', '')}-{query}-{model_name}-{variant}"
     return hashlib.md5(key_data.encode()).hexdigest()
 
 
 # Check cache before analyzing
-def get_cached_analysis(paper):
-    cache_key = get_paper_cache_key(paper)
-    return paper_analysis_cache.get(cache_key)
+def get_cached_analysis(paper, query=None, model_name=None, variant="single"):
+    cache_key = get_paper_cache_key(paper, query, model_name, variant)
+    return analysis_cache.get(cache_key)
 
 
 # Store analysis in cache
-def cache_paper_analysis(paper, analysis):
-    cache_key = get_paper_cache_key(paper)
-    paper_analysis_cache[cache_key] = analysis
-    # Limit cache size to prevent memory issues
-    if len(paper_analysis_cache) > 1000:
-        # Remove oldest entries
-        for k in list(paper_analysis_cache.keys())[:100]:
-            paper_analysis_cache.pop(k, None)
+def cache_paper_analysis(paper, analysis, query=None, model_name=None, variant="single"):
+    cache_key = get_paper_cache_key(paper, query, model_name, variant)
+    analysis_cache.set(cache_key, analysis)
+
+
+# Helper function to generate a cache key for a search request
+def get_search_cache_key(query, max_results, rerank, prioritize_recency):
+    # Normalize case and whitespace so trivially different queries share an entry
+    normalized_query = " ".join(query.lower().split())
+    return json.dumps([normalized_query, max_results, bool(rerank), bool(prioritize_recency)])
+
+
+# Wait until the next arXiv request slot, spacing requests of all threads by ARXIV_REQUEST_INTERVAL
+def wait_for_arxiv_slot():
+    global arxiv_next_request
+    with arxiv_rate_lock:
+        now = time.monotonic()
+        slot = max(now, arxiv_next_request)
+        arxiv_next_request = slot + ARXIV_REQUEST_INTERVAL
+    time.sleep(slot - now)
+
+
+# Run a blocking call (Pinecone, PDF parsing) in the default executor from an async view
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+# Non-blocking HTTP client of the running event loop, shared by the async views served on it
+def get_http_client():
+    loop = asyncio.get_running_loop()
+    client = http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, follow_redirects=True)
+        http_clients[loop] = client
+    return client
+
+
+# Close the HTTP client of the running event loop, if it opened one
+async def close_http_client():
+    client = http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# Convert an arxiv result into the article format used by the API
+def process_arxiv_result(result):
+    return {
+        'title': result.title,
+        'summary': result.summary,
+        'url': result.entry_id,
+        'authors': [author.name for author in result.authors],
+        'published_date': result.published.strftime('%Y-%m-%d')
+    }
 
 
 # Function to search for articles using the arxiv API
 def search_articles(query, max_results=10):
+    import arxiv
+
     search = arxiv.Search(
         query=query,
         max_results=max_results,
         sort_by=arxiv.SortCriterion.Relevance
     )
 
+    wait_for_arxiv_slot()
     results = list(search.results())
 
     # Process results
-    processed_results = []
-    for result in results:
-        processed_results.append({
-            'title': result.title,
-            'summary': result.summary,
-            'url': result.entry_id,
-            'authors': [author.name for author in result.authors],
-            'published_date': result.published.strftime('%Y-%m-%d')
-        })
+    processed_results = [process_arxiv_result(result) for result in results]
 
     # If citation priority is set, we'll need to sort by citation count
     # This will be handled by the frontend since we need to fetch citation counts there
@@ -97,12 +248,68 @@ def search_articles(query, max_results=10):
     return processed_results[:max_results]
 
 
+# Function to fetch articles by arXiv id using the arxiv API
+def fetch_articles_by_id(arxiv_ids):
+    import arxiv
+
+    search = arxiv.Search(id_list=arxiv_ids, max_results=len(arxiv_ids))
+    wait_for_arxiv_slot()
+    return [process_arxiv_result(result) for result in search.results()]
+
+
+# Resolve a paper title to at most one article, using the title cache and the arXiv id fast path
+def resolve_title(title):
+    cache_key = " ".join(title.lower().split())
+    cached = title_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # A title that contains an arXiv id is looked up directly instead of searched
+    match = ARXIV_ID_PATTERN.search(title)
+    if match:
+        found = fetch_articles_by_id([match.group(0)])[:1]
+    else:
+        found = search_articles(title, max_results=1)
+    title_cache.set(cache_key, found)
+    return found
+
+
 # Function to add articles to FAISS index
 def add_article_to_db(article):
-    text = article['summary']
-    embedding = model.encode([text])[0]
-    articles_db[article['url']] = article
-    index.add(np.array([embedding], dtype=np.float32))
+    add_articles_to_db([article])
+
+
+# Function to add a batch of articles to FAISS index with a single encode and index.add
+def add_articles_to_db(articles, batch_size=EMBED_BATCH_SIZE):
+    # Skip articles already stored and duplicates within the batch, keeping the first occurrence
+    new_articles = {}
+    for article in articles:
+        if article['url'] not in articles_db and article['url'] not in new_articles:
+            new_articles[article['url']] = article
+
+    if not new_articles:
+        return 0
+
+    texts = [article['summary'] for article in new_articles.values()]
+    embeddings = embedding.encode_cached(texts, batch_size=batch_size)
+    # The store skips articles a concurrent request added while these were being encoded
+    return vector_store.add(list(new_articles.values()), embeddings)
+
+
+# Articles found by /search are embedded and indexed by a background worker, off the response path
+ingestion_queue = IngestionQueue(
+    add_articles_to_db,
+    batch_size=EMBED_BATCH_SIZE,
+    max_wait=float(os.getenv("INGEST_BATCH_WAIT_MS", "100")) / 1000,
+    max_pending=int(os.getenv("INGEST_MAX_PENDING", "10000"))
+)
+
+
+# Queue the articles that are not indexed yet for background ingestion
+def enqueue_articles(articles):
+    new_articles = [article for article in articles if article['url'] not in vector_store]
+    if new_articles:
+        ingestion_queue.submit(new_articles)
 
 
 # Route for searching articles, using POST instead of GET for the query
@@ -121,6 +328,13 @@ def search():
     if not query:
         return jsonify({"error": "Query is required"}), 400
     
+    cache_key = get_search_cache_key(query, max_results, rerank, prioritize_recency)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        # The entry may come from the disk tier of a previous run, so make sure the papers are indexed
+        enqueue_articles(cached["papers"])
+        return jsonify(dict(cached, citation_priority=prioritize_citation))
+    
     # Get initial articles from arXiv
     articles = search_articles(query, max_results=max_results)
     if rerank:
@@ -130,33 +344,41 @@ def search():
     if prioritize_recency:
         articles.sort(key=lambda x: x.get('published_date', '1970-01-01'), reverse=True)
     
-    # Add articles to the DB and index if they are not already present
-    for article in articles:
-        if article['url'] not in articles_db:
-            add_article_to_db(article)
-    
     # Generate structured recommendations for influential papers
     if len(articles) > 0:
         recommendations = generate_paper_recommendations(query, articles)
         
         # For each recommended paper, find a related paper from arXiv
+        # The lookups run concurrently and share one deadline
+        related_searches = {}
         for paper_type in recommendations:
             if paper_type != "query" and recommendations[paper_type]:
                 paper = recommendations[paper_type]
                 # Use the paper title to find related papers
                 related_title = paper.get('title', '')
                 related_query = f"{related_title} {query}"
-                related_papers = search_articles(related_query, max_results=2)
-                
-                # Add the first related paper that's not already in our results
-                for related_paper in related_papers:
-                    if related_paper['url'] not in [a['url'] for a in articles]:
-                        related_paper['is_related_to'] = paper['title']
-                        articles.append(related_paper)
-                        # Add to DB if not present
-                        if related_paper['url'] not in articles_db:
-                            add_article_to_db(related_paper)
-                        break
+                related_searches[paper_type] = arxiv_executor.submit(search_articles, related_query, max_results=2)
+        done, _ = wait(related_searches.values(), timeout=RELATED_PAPERS_TIMEOUT)
+        
+        # Merge in recommendation order, so the result does not depend on which lookup finished first
+        for paper_type, future in related_searches.items():
+            if future not in done:
+                future.cancel()
+                print(f"Related paper search for {paper_type} timed out")
+                continue
+            try:
+                related_papers = future.result()
+            except Exception as e:
+                print(f"Error searching related papers for {paper_type}: {str(e)}")
+                continue
+            
+            # Add the first related paper that's not already in our results
+            paper = recommendations[paper_type]
+            for related_paper in related_papers:
+                if related_paper['url'] not in [a['url'] for a in articles]:
+                    related_paper['is_related_to'] = paper['title']
+                    articles.append(related_paper)
+                    break
     else:
         recommendations = {
             "query": query,
@@ -165,6 +387,11 @@ def search():
             "most_recent": None
         }
     
+    # Queue all new articles of this request, including related papers, for indexing in the background
+    enqueue_articles(articles)
+    
+    search_cache.set(cache_key, {"papers": articles, "recommendations": recommendations})
+    
     # Return citation priority flag to frontend along with recommendations
     return jsonify({
         "papers": articles,
@@ -172,6 +399,97 @@ def search():
         "recommendations": recommendations
     })
 
+
+# Format one server-sent event
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Stream (event, data) pairs as server-sent events, recording time to first byte and total time in /metrics
+def sse_stream(events):
+    endpoint = request.endpoint
+    request_start = g.request_start
+
+    def generate():
+        first_byte = True
+        try:
+            for event, data in events:
+                if first_byte:
+                    request_metrics.observe(f"{endpoint}.ttfb_ms", (time.perf_counter() - request_start) * 1000)
+                    first_byte = False
+                yield sse_event(event, data)
+        except Exception as e:
+            print(f"Error streaming {endpoint}: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+        request_metrics.observe(f"{endpoint}.stream_total_ms", (time.perf_counter() - request_start) * 1000)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Stream text deltas as server-sent events: a "token" event per delta, then a "done" event with the final payload
+def sse_response(deltas, final_payload):
+    """
+    Parameters:
+        deltas: Iterable of text deltas, consumed while the response is sent
+        final_payload: Function from the full text to the JSON payload of the "done" event
+    
+    Returns:
+        A text/event-stream response. Time to first byte and total time are recorded separately in /metrics.
+    """
+    def events():
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            yield "token", {"delta": delta}
+        yield "done", final_payload("".join(parts))
+
+    return sse_stream(events())
+
+
+# Liveness: the process is up and serving requests, even while the model is still loading
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# Readiness: the embedding model is loaded, so requests are answered without waiting for it
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = {"embedding_model": embedding.status(), "vector_store": {"rows": len(vector_store)}}
+    if not embedding.is_ready():
+        return jsonify(dict(status, status="warming_up")), 503
+    return jsonify(dict(status, status="ready"))
+
+
+# Route for reporting endpoint latency, LLM call latency and token usage, the ingestion backlog and index memory
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({"endpoints": request_metrics.summary(), "llm": llm.metrics.summary(),
+                    "ingestion": ingestion_queue.stats(), "vector_store": vector_store.memory_usage()})
+
+
+# Route that waits until the articles queued so far are indexed, for clients that need read-after-write
+@app.route('/ingestion/flush', methods=['POST'])
+def flush_ingestion():
+    timeout = (request.get_json(silent=True) or {}).get('timeout')
+    if not ingestion_queue.flush(timeout=timeout):
+        return jsonify({"error": "Ingestion did not finish in time", **ingestion_queue.stats()}), 504
+    return jsonify(ingestion_queue.stats())
+
+
+# Route for reporting cache hit/miss counters and sizes by namespace
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    stats = {namespace: cache.stats() for namespace, cache in caches.items()}
+    stats["embeddings"] = embedding.get_cache().stats()
+    stats["documents"] = document_store.stats()
+    stats["chunk_indexes"] = chunk_index.stats()
+    stats["query_embeddings"] = embedding.query_stats()
+    stats["pinecone_query_embeddings"] = database.query_stats()
+    stats["citation_requests"] = citation_counts.stats()
+    return jsonify(stats)
+
 def extract_papers_from_response(query, response_text):
     """
     Extract paper titles from the model's response text.
@@ -213,13 +531,8 @@ def extract_papers_from_response(query, response_text):
     If no papers are found, return an empty JSON object.
     """
 
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=openai_api_key
-    )
-
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion("extract_papers_from_response",
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=1000,
@@ -273,7 +586,8 @@ def get_papers_by_title():
     if not isinstance(titles, list):
         return jsonify({"error": "Titles should be a list"}), 400
     
-    found_papers = []
+    # Resolve the titles concurrently on the shared arXiv pool, which bounds the number of requests in flight
+    lookups = []
     for title in titles:
         # Search for papers by title
         # the title would be in format {'title': 'paper title'}
@@ -282,7 +596,16 @@ def get_papers_by_title():
         elif not isinstance(title, str):
             continue  # Skip if title is not a string
         print(f"Searching for title: {title}")
-        search_results = search_articles(title, max_results=1)
+        lookups.append((title, arxiv_executor.submit(resolve_title, title)))
+
+    # Keep the order of the requested titles
+    found_papers = []
+    for title, lookup in lookups:
+        try:
+            search_results = lookup.result()
+        except Exception as e:
+            print(f"Error searching for title {title}: {str(e)}")
+            continue
         if search_results:
             found_papers.append(search_results[0])
     
@@ -367,13 +690,8 @@ def generate_paper_recommendations(query, articles):
     Ensure your response is valid JSON that can be parsed.
     """
     
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=openai_api_key
-    )
-    
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion("generate_paper_recommendations",
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=1000,
@@ -401,34 +719,27 @@ def generate_paper_recommendations(query, articles):
 
 # Route for retrieving similar articles (search in the vector space)
 @app.route('/similar', methods=['POST'])
-def similar():
+async def similar():
     query = request.json.get('query')
     rerank = request.json.get('rerank', True)
+    # Optional per-request accuracy/latency knobs for IVF (nprobe) and HNSW (ef_search) indexes
+    nprobe = request.json.get('nprobe')
+    ef_search = request.json.get('ef_search')
     if not query:
         return jsonify({"error": "Query is required"}), 400
-    # Encode the query to get its vector
-    query_vector = model.encode([query])[0]
+    # Encode the query to get its vector, batched with the concurrent queries unless it is cached
+    query_vector = await embedding.encode_query_async(query)
     # Search for similar articles in FAISS
-    _, indices = index.search(np.array([query_vector], dtype=np.float32), k=5)
-    similar_articles = [articles_db[list(articles_db.keys())[i]] for i in indices[0]]
-    if rerank:
-        similar_articles = database.rerank_papers(query=query, papers = similar_articles, text_attr=lambda p: p['summary'])
+    similar_articles = vector_store.search(query_vector, k=5, nprobe=nprobe, ef_search=ef_search)
+    if rerank and similar_articles:
+        similar_articles = await run_blocking(database.rerank_papers, query=query, papers=similar_articles,
+                                              text_attr=lambda p: p['summary'])
 
     return jsonify(similar_articles)
 
 
-def generate_literature_survey(selected_articles, model_name='gpt-4o', history=[]):
-    """
-    Generate a comprehensive literature survey based on selected articles.
-    
-    Parameters:
-        selected_articles: List of articles with their details and analysis
-        model_name: The model to use for generation
-        history: Optional chat history to enhance context
-    
-    Returns:
-        A string containing the generated literature survey
-    """
+# Build the prompt messages of a literature survey over the selected articles
+def literature_survey_messages(selected_articles, history=[]):
     # Format the articles information for the prompt
     articles_text = ""
     for i, article in enumerate(selected_articles):
@@ -486,15 +797,51 @@ def generate_literature_survey(selected_articles, model_name='gpt-4o', history=[
     Based on the above information, please generate a high-quality literature survey that integrates the findings from all selected papers.
     """
 
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=openai_api_key
-    )
+    return [{"role": "user", "content": prompt}] + history
+
+
+def generate_literature_survey(selected_articles, model_name='gpt-4o', history=[], stream=False):
+    """
+    Generate a comprehensive literature survey based on selected articles.
+    
+    Parameters:
+        selected_articles: List of articles with their details and analysis
+        model_name: The model to use for generation
+        history: Optional chat history to enhance context
+        stream: Return an iterator of text deltas instead of waiting for the whole survey
+    
+    Returns:
+        A string containing the generated literature survey, or an iterator of its text deltas when streaming
+    """
+    messages = literature_survey_messages(selected_articles, history)
+
+    if stream:
+        return llm.stream_chat_completion("generate_literature_survey",
+            model=model_name,
+            messages=messages,
+            max_tokens=2000,
+            temperature=0.3
+        )
 
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion("generate_literature_survey",
             model=model_name,
-            messages=[{"role": "user", "content": prompt}] + history,
+            messages=messages,
+            max_tokens=2000,
+            temperature=0.3
+        )
+
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error generating literature survey: {str(e)}"
+
+
+# Awaitable generate_literature_survey for async views
+async def generate_literature_survey_async(selected_articles, model_name='gpt-4o', history=[]):
+    try:
+        response = await llm.chat_completion_async("generate_literature_survey",
+            model=model_name,
+            messages=literature_survey_messages(selected_articles, history),
             max_tokens=2000,
             temperature=0.3
         )
@@ -506,18 +853,23 @@ def generate_literature_survey(selected_articles, model_name='gpt-4o', history=[
 
 # Route for generating literature survey
 @app.route('/generate-survey', methods=['POST'])
-def generate_survey():
+async def generate_survey():
     selected_articles = request.json.get('selected_articles')
     if not selected_articles:
         return jsonify({"error": "Selected articles are required"}), 400
 
+    if request.json.get('stream', False):
+        return sse_response(generate_literature_survey(selected_articles, stream=True),
+                            lambda survey: {"survey": survey})
+
     # Generate the literature survey
-    survey = generate_literature_survey(selected_articles)
+    survey = await generate_literature_survey_async(selected_articles)
 
     return jsonify({"survey": survey})
 
 
-def chat_with_agent(query: str, history: list = [], model_name: str = 'gpt-4o-mini'):
+def chat_with_agent(query: str, history: list = [], model_name: str = 'gpt-4o-mini', stream: bool = False,
+                    caller: str = 'chat_with_agent'):
     """
     Regular chat function that maintains conversation history
     
@@ -525,17 +877,22 @@ def chat_with_agent(query: str, history: list = [], model_name: str = 'gpt-4o-mi
         query: User's current question/input
         history: List of previous conversation messages
         model_name: The model to use for chat
+        stream: Return an iterator of text deltas instead of the response and history
+        caller: Name of the LLM call in /metrics, to compare prompt variants
     """
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-
     # Combine history with current query
     messages = history + [{"role": "user", "content": query}]
 
+    if stream:
+        return llm.stream_chat_completion(caller,
+            model=model_name,
+            messages=messages,
+            max_tokens=800,
+            temperature=0.7
+        )
+
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion(caller,
             model=model_name,
             messages=messages,
             max_tokens=800,
@@ -687,13 +1044,8 @@ def analyze_paper(article, model_name='gpt-4o-mini', all_articles=None, query=No
         Ensure your response is valid JSON that can be parsed.
         """
 
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=openai_api_key
-    )
-
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion("analyze_paper",
             model=model_name,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=1000,
@@ -721,11 +1073,16 @@ def analyze_paper_endpoint():
     model_name = data.get('model', 'gpt-4o-mini')
     query = data.get('query', None)  # Get the query parameter if provided
 
+    cached_analysis = get_cached_analysis(article, query, model_name)
+    if cached_analysis is not None:
+        return jsonify(cached_analysis)
+
     analysis = analyze_paper(article, model_name, query=query)
 
     if "error" in analysis:
         return jsonify(analysis), 500
 
+    cache_paper_analysis(article, analysis, query, model_name)
     return jsonify(analysis)
 
 
@@ -749,13 +1106,19 @@ def analyze_papers_batch():
     for paper in papers:
         paper_id = paper.get('url') or paper.get('title')
         if not paper.get('analysis'):
-            papers_to_analyze.append(paper)
+            cached_analysis = get_cached_analysis(paper, query, model_name, variant="batch")
+            if cached_analysis is not None:
+                paper_cache[paper_id] = cached_analysis
+            else:
+                papers_to_analyze.append(paper)
         else:
             # Keep already analyzed papers in the cache
             paper_cache[paper_id] = paper['analysis']
 
     # If all papers are already analyzed, return immediately
     if not papers_to_analyze:
+        for paper in papers:
+            paper['analysis'] = paper_cache[paper.get('url') or paper.get('title')]
         return jsonify({"papers": papers})
 
     # Prepare a consolidated prompt for all papers
@@ -840,12 +1203,7 @@ def analyze_papers_batch():
     """
 
     # Make a single API call for all papers
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=openai_api_key
-    )
-
-    response = client.chat.completions.create(
+    response = llm.chat_completion("analyze_papers_batch",
         model=model_name,
         messages=[
             {"role": "system",
@@ -882,6 +1240,7 @@ def analyze_papers_batch():
                 "strengths": paper_analysis.get("strengths", []),
                 "weaknesses": paper_analysis.get("weaknesses", [])
             }
+            cache_paper_analysis(paper, paper['analysis'], query, model_name, variant="batch")
         else:
             # Fallback if the API didn't return analysis for all papers
             paper['analysis'] = {
@@ -988,13 +1347,8 @@ def generate_comparative_analysis(articles, model_name='gpt-4o-mini', query=None
     Ensure your response is valid JSON that can be parsed.
     """
 
-    client = OpenAI(
-        base_url="https://api.gptsapi.net/v1",
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-
     try:
-        response = client.chat.completions.create(
+        response = llm.chat_completion("generate_comparative_analysis",
             model=model_name,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=1500,
@@ -1020,6 +1374,7 @@ def compare_papers():
     query = data.get('query', '')
     history = data.get('history', [])
     model_name = data.get('model', 'gpt-4o-mini')
+    stream = data.get('stream', False)
 
     if not papers or len(papers) < 2:
         return jsonify({"error": "At least two papers are required for comparison"}), 400
@@ -1067,6 +1422,45 @@ def compare_papers():
 
             comparison_prompt += "\n"
 
+        if stream:
+            # A streamed answer is shown as it arrives, so ask for the final Markdown layout instead of JSON
+            comparison_prompt += """
+        Provide a comparative analysis of these papers in relation to the query. Include:
+        1. A brief comparison of their approaches
+        2. Their relative strengths and weaknesses
+        3. A synthesis of their contributions
+        
+        Format your response in Markdown with the following structure:
+        # Comparative Analysis of Selected Papers
+        
+        ## Title of Paper 1
+        
+        **Approach:** Brief description of approach
+        
+        **Strengths:**
+        - strength1
+        
+        **Weaknesses:**
+        - weakness1
+        
+        (one section per paper)
+        
+        ## Synthesis
+        
+        Overall synthesis of the papers' contributions and how they relate to the query
+        """
+            messages = [
+                {"role": "system",
+                 "content": "You are a research assistant that compares academic papers in computer science and AI."},
+                {"role": "user", "content": comparison_prompt}
+            ]
+            return sse_response(
+                llm.stream_chat_completion("compare_papers", model=model_name, messages=messages),
+                lambda response: {"response": response, "history": history + [
+                    {"role": "user", "content": query},
+                    {"role": "assistant", "content": response}
+                ]})
+
         comparison_prompt += f"""
         Provide a comparative analysis of these papers in relation to the query. Include:
         1. A brief comparison of their approaches
@@ -1089,12 +1483,7 @@ def compare_papers():
         """
 
         # Make a single API call for the comparison
-        client = OpenAI(
-            base_url="https://api.gptsapi.net/v1",
-            api_key=openai_api_key
-        )
-
-        response = client.chat.completions.create(
+        response = llm.chat_completion("compare_papers",
             model=model_name,
             messages=[
                 {"role": "system",
@@ -1141,6 +1530,26 @@ def compare_papers():
         return jsonify({"error": f"Failed to compare papers: {str(e)}"}), 500
 
 
+# Prompt section of the open PDF: the chunks most relevant to the query, or the whole text when it is short
+# or the mode is "full". Return the section and the mode used.
+def get_pdf_context(query, doc_id, pages, mode):
+    start = time.perf_counter()
+    text = pdf_text.join_pages(pages)
+    if mode == "full" or len(text) <= chunk_index.CHUNK_CHARS * chunk_index.CHUNK_TOP_K:
+        mode = "full"
+        context = f"\n\nHere is the content of the currently open PDF document that may be relevant to your query:\n\n{text}\n\n"
+    else:
+        mode = "chunks"
+        chunks = chunk_index.get_index(doc_id, pages).search(query)
+        # Page numbers are only known for documents referenced by id
+        passages = "\n\n".join(
+            f"[Page {chunk['page']}] {chunk['text']}" if len(pages) > 1 else chunk['text'] for chunk in chunks)
+        context = f"\n\nHere are the passages of the currently open PDF document most relevant to your query:\n\n{passages}\n\n"
+    request_metrics.observe(f"chat.pdf_{mode}.context_chars", len(context))
+    request_metrics.observe(f"chat.pdf_{mode}.context_ms", (time.perf_counter() - start) * 1000)
+    return context, mode
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -1151,6 +1560,7 @@ def chat():
     history = data.get('history', [])
     model_name = data.get('model', 'gpt-4o-mini')
     user_understanding = data.get('user_understanding', {})
+    stream = data.get('stream', False)
 
     # Construct a context based on user understanding
     understanding_context = ""
@@ -1194,6 +1604,14 @@ def chat():
 
     # Handle literature survey request
     if is_literature_survey_request:
+        if stream:
+            return sse_response(
+                generate_literature_survey(papers_info, model_name, history, stream=True),
+                lambda survey: {"response": survey, "history": history + [
+                    {"role": "user", "content": query},
+                    {"role": "assistant", "content": survey}
+                ]})
+
         # Generate a literature survey based on the selected papers
         survey = generate_literature_survey(papers_info, model_name, history)
         return jsonify({"response": survey, "history": history + [
@@ -1235,10 +1653,28 @@ def chat():
         if "synthesis" in comparative_analysis:
             formatted_response += f"## Synthesis\n\n{comparative_analysis['synthesis']}\n\n"
 
-        return jsonify({"response": formatted_response, "history": history + [
+        history = history + [
             {"role": "user", "content": query},
             {"role": "assistant", "content": formatted_response}
-        ]})
+        ]
+        if stream:
+            # The comparison is assembled from several structured calls, so it is sent as a single event
+            return sse_response([formatted_response], lambda response: {"response": response, "history": history})
+        return jsonify({"response": formatted_response, "history": history})
+
+    # The open PDF is sent inline, or referenced by the doc_id returned by /extract-pdf-text.
+    # Only the regular chat uses it, so the surveys and comparisons above do not look it up
+    pdf_pages = None
+    if data.get('pdf_text_content'):
+        pdf_pages = [data['pdf_text_content']]
+        pdf_doc_id = content_doc_id(data['pdf_text_content'].encode())
+    elif data.get('pdf_doc_id'):
+        pdf_doc_id = data['pdf_doc_id']
+        pdf_pages = document_store.get(pdf_doc_id)
+        if pdf_pages is None:
+            # Evicted from the document store: the client extracts the PDF again, or sends its text, and retries
+            return jsonify({"error": "PDF document not found, extract its text again", "pdf_doc_id": pdf_doc_id}), 404
+    pdf_context_mode = data.get('pdf_context', PDF_CONTEXT_MODE)
 
     # Regular chat functionality with selected papers context
     if papers_info:
@@ -1255,23 +1691,28 @@ def chat():
         enhanced_query = f"{understanding_context}\n\n{papers_context}\n\n{query}"
 
         # Check if PDF text content is available
-        if 'pdf_text_content' in data and data['pdf_text_content']:
-            pdf_context = f"\n\nHere is the content of the currently open PDF document that may be relevant to your query:\n\n{data['pdf_text_content']}\n\n"
+        if pdf_pages:
+            pdf_context, pdf_context_mode = get_pdf_context(query, pdf_doc_id, pdf_pages, pdf_context_mode)
             enhanced_query += pdf_context
-
-        # Use the enhanced query for the chat
-        result = chat_with_agent(enhanced_query, history, model_name)
     else:
         # Regular chat without papers context, but with PDF content if available
         enhanced_query = f"{understanding_context}\n\n{query}"
 
         # Check if PDF text content is available
-        if 'pdf_text_content' in data and data['pdf_text_content']:
-            pdf_context = f"\n\nHere is the content of the currently open PDF document that may be relevant to your query:\n\n{data['pdf_text_content']}\n\n"
+        if pdf_pages:
+            pdf_context, pdf_context_mode = get_pdf_context(query, pdf_doc_id, pdf_pages, pdf_context_mode)
             enhanced_query += pdf_context
 
-        # Use the enhanced query for the chat
-        result = chat_with_agent(enhanced_query, history, model_name)
+    # Use the enhanced query for the chat, PDF prompt variants are reported separately in /metrics
+    caller = f"chat_with_agent.pdf_{pdf_context_mode}" if pdf_pages else "chat_with_agent"
+    if stream:
+        messages = history + [{"role": "user", "content": enhanced_query}]
+        return sse_response(
+            chat_with_agent(enhanced_query, history, model_name, stream=True, caller=caller),
+            lambda response: {"response": response,
+                              "history": messages + [{"role": "assistant", "content": response}]})
+
+    result = chat_with_agent(enhanced_query, history, model_name, caller=caller)
 
     if "error" in result:
         return jsonify(result), 500
@@ -1280,55 +1721,73 @@ def chat():
 
 
 @app.route('/extract-pdf-text', methods=['POST'])
-def extract_pdf_text():
+async def extract_pdf_text():
     data = request.json
 
     if not data or 'pdf_url' not in data:
         return jsonify({"error": "PDF URL is required"}), 400
 
     pdf_url = data['pdf_url']
+    stream = data.get('stream', False)
 
-    try:
-        # Download the PDF from the URL
-        print(pdf_url)
-        response = requests.get(pdf_url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        # Create a BytesIO object from the response content
-        pdf_file = BytesIO(response.content)
-
-        # Create a PDF reader object
-        pdf_reader = PdfReader(pdf_file)
-
-        # Extract text from all pages
-        text_content = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text_content += page.extract_text() + "\n\n"
-
-        # Return the extracted text
-        return jsonify({"text_content": text_content})
+    # A versioned arXiv paper extracted before is served without downloading it again
+    doc_id = arxiv_doc_id(pdf_url)
+    pages = await run_blocking(document_store.get, doc_id) if doc_id else None
+    pdf_file = None
+    if pages is None:
+        try:
+            # Stream the PDF into a temporary file, which the extraction workers read from disk
+            print(pdf_url)
+            pdf_file = await pdf_text.download(get_http_client(), pdf_url)
+        except httpx.HTTPError as e:
+            return jsonify({"error": f"Failed to download PDF: {str(e)}"}), 500
+        except Exception as e:
+            return jsonify({"error": f"Failed to extract text from PDF: {str(e)}"}), 500
+        if doc_id is None:
+            doc_id = await run_blocking(file_doc_id, pdf_file.name)
+            pages = await run_blocking(document_store.get, doc_id)
+        if pages is not None:
+            pdf_file.close()
+
+    if stream:
+        # One "page" event per page as soon as it is extracted, then a "done" event with the page count
+        def events():
+            if pages is not None:
+                yield from (("page", {"page": i, "text": text}) for i, text in enumerate(pages, start=1))
+                yield "done", {"pages": len(pages), "doc_id": doc_id}
+                return
+            with pdf_file:
+                extracted = []
+                for text in pdf_text.iter_pages(pdf_file.name):
+                    extracted.append(text)
+                    yield "page", {"page": len(extracted), "text": text}
+            document_store.put(doc_id, extracted)
+            yield "done", {"pages": len(extracted), "doc_id": doc_id}
+
+        return sse_stream(events())
+
+    if pages is None:
+        try:
+            # Pages are parsed in parallel in the PDF process pool, off the event loop
+            with pdf_file:
+                pages = await run_blocking(lambda: list(pdf_text.iter_pages(pdf_file.name)))
+        except Exception as e:
+            return jsonify({"error": f"Failed to extract text from PDF: {str(e)}"}), 500
+        await run_blocking(document_store.put, doc_id, pages)
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to download PDF: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"error": f"Failed to extract text from PDF: {str(e)}"}), 500
+    # Return the extracted text, and the id under which /chat can reference it
+    return jsonify({"text_content": pdf_text.join_pages(pages), "doc_id": doc_id})
 
 
 # Add route handler for expanding keywords
 @app.route('/expand-keywords', methods=['POST'])
-def expand_keywords():
+async def expand_keywords():
     query = request.json.get('query')
     if not query:
         return jsonify({"error": "Query is required"}), 400
 
     try:
-        client = OpenAI(
-            base_url="https://api.gptsapi.net/v1",
-            api_key=openai_api_key
-        )
-
-        response = client.chat.completions.create(
+        response = await llm.chat_completion_async("expand_keywords",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system",
@@ -1352,18 +1811,13 @@ def expand_keywords():
 
 # Update the generate-questions endpoint
 @app.route('/generate-questions', methods=['POST'])
-def generate_questions():
+async def generate_questions():
     query = request.json.get('query')
     if not query:
         return jsonify({"error": "Query is required"}), 400
 
     try:
-        client = OpenAI(
-            base_url="https://api.gptsapi.net/v1",
-            api_key=openai_api_key
-        )
-
-        response = client.chat.completions.create(
+        response = await llm.chat_completion_async("generate_questions",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system",
@@ -1398,7 +1852,7 @@ def update_understanding():
 
 
 @app.route('/generate-knowledge-insights', methods=['POST'])
-def generate_knowledge_insights():
+async def generate_knowledge_insights():
     try:
         user_profile = request.json.get('userProfile', {})
 
@@ -1446,12 +1900,7 @@ def generate_knowledge_insights():
         """
 
         # Call the OpenAI API
-        client = OpenAI(
-            base_url="https://api.gptsapi.net/v1",
-            api_key=openai_api_key
-        )
-
-        response = client.chat.completions.create(
+        response = await llm.chat_completion_async("generate_knowledge_insights",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system",
@@ -1489,105 +1938,138 @@ def generate_knowledge_insights():
 
 
 @app.route('/get-citation-count', methods=['POST'])
-def get_citation_count():
+async def get_citation_count():
     paper_id = request.json.get('paper_id')
     if not paper_id:
         return jsonify({"error": "Paper ID is required"}), 400
 
     try:
-        # Extract arXiv ID from the URL if it's an arXiv paper
-        arxiv_id = None
-        if 'arxiv.org' in paper_id:
-            # Extract the ID from URLs like https://arxiv.org/abs/2106.09685
-            parts = paper_id.split('/')
-            arxiv_id = parts[-1]
-            if 'v' in arxiv_id:  # Remove version suffix (e.g., v1, v2)
-                arxiv_id = arxiv_id.split('v')[0]
-
-        # If we have an arXiv ID, query Semantic Scholar API
-        if arxiv_id:
-            # URL encode the arXiv ID
-            encoded_id = quote(f"arXiv:{arxiv_id}")
-            url = f"https://api.semanticscholar.org/graph/v1/paper/{encoded_id}?fields=citationCount"
-
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                citation_count = data.get('citationCount', 0)
-
-                # Cache the result to avoid repeated API calls
-                cache_key = f"citation_{arxiv_id}"
-                paper_analysis_cache[cache_key] = citation_count
-
-                return jsonify({"citation_count": citation_count})
-            else:
-                # If API call fails, check cache
-                cache_key = f"citation_{arxiv_id}"
-                cached_count = paper_analysis_cache.get(cache_key)
-                if cached_count is not None:
-                    return jsonify({"citation_count": cached_count})
-
+        counts = await get_citation_counts_by_url([paper_id])
         # If we couldn't get a citation count, return 0
-        return jsonify({"citation_count": 0})
+        return jsonify({"citation_count": counts[paper_id] or 0})
 
     except Exception as e:
         print(f"Error getting citation count: {str(e)}")
         return jsonify({"error": f"Failed to get citation count: {str(e)}"}), 500
 
 
+# Route for the citation counts of many papers at once: cached counts first, the rest in one Semantic Scholar request
+@app.route('/get-citation-counts', methods=['POST'])
+async def get_citation_counts():
+    paper_ids = (request.get_json(silent=True) or {}).get('paper_ids')
+    if not isinstance(paper_ids, list) or not all(isinstance(paper_id, str) for paper_id in paper_ids):
+        return jsonify({"error": "paper_ids must be a list of paper URLs"}), 400
+    if len(paper_ids) > MAX_CITATION_BATCH:
+        return jsonify({"error": f"At most {MAX_CITATION_BATCH} paper ids per request"}), 400
+
+    try:
+        # Counts that could not be fetched are null, so the client can tell them from papers without citations
+        return jsonify({"citation_counts": await get_citation_counts_by_url(paper_ids)})
+
+    except Exception as e:
+        print(f"Error getting citation counts: {str(e)}")
+        return jsonify({"error": f"Failed to get citation counts: {str(e)}"}), 500
+
+
+# Helper function to look up citation counts by paper URL; papers outside arXiv have none
+async def get_citation_counts_by_url(paper_ids):
+    arxiv_ids = {paper_id: arxiv_id_from_url(paper_id) for paper_id in paper_ids}
+    counts = await citation_counts.get_many(get_http_client(), [i for i in arxiv_ids.values() if i])
+    return {paper_id: counts[arxiv_id] if arxiv_id else 0 for paper_id, arxiv_id in arxiv_ids.items()}
+
+
 @app.route('/get-paper-metadata', methods=['POST'])
 def get_paper_metadata():
     paper_id = request.json.get('paper_id')
     if not paper_id:
         return jsonify({"error": "Paper ID is required"}), 400
 
-    try:
-        # Extract arXiv ID from the URL if it's an arXiv paper
-        arxiv_id = None
-        if 'arxiv.org' in paper_id:
-            # Extract the ID from URLs like https://arxiv.org/abs/2106.09685
-            parts = paper_id.split('/')
-            arxiv_id = parts[-1]
-            if 'v' in arxiv_id:  # Remove version suffix (e.g., v1, v2)
-                arxiv_id = arxiv_id.split('v')[0]
-
-        if not arxiv_id:
-            return jsonify({"error": "Could not extract arXiv ID"}), 400
-
-        # Use the arxiv library to get paper metadata
-        search = arxiv.Search(id_list=[arxiv_id], max_results=10)
-        paper = next(search.results())
-
-        # Format the publication date
-        pub_date = paper.published.strftime('%Y.%m.%d')
-
-        # Cache the result
-        cache_key = f"metadata_{arxiv_id}"
-        paper_analysis_cache[cache_key] = {
-            "publication_date": pub_date,
-            "updated_date": paper.updated.strftime('%Y.%m.%d') if paper.updated else None
-        }
+    # Extract arXiv ID from URLs like https://arxiv.org/abs/2106.09685
+    arxiv_id = arxiv_id_from_url(paper_id)
+    if not arxiv_id:
+        return jsonify({"error": "Could not extract arXiv ID"}), 400
 
-        return jsonify({
-            "publication_date": pub_date,
-            "updated_date": paper.updated.strftime('%Y.%m.%d') if paper.updated else None
-        })
+    try:
+        metadata, failed = get_arxiv_metadata([arxiv_id])
+        if arxiv_id in failed:
+            return jsonify({"error": "Failed to get paper metadata from arXiv"}), 500
+        if metadata[arxiv_id] is None:
+            return jsonify({"error": "Paper not found"}), 404
+        return jsonify(metadata[arxiv_id])
 
-    except StopIteration:
-        # Paper not found
-        return jsonify({"error": "Paper not found"}), 404
     except Exception as e:
         print(f"Error getting paper metadata: {str(e)}")
+        return jsonify({"error": f"Failed to get paper metadata: {str(e)}"}), 500
+
 
-        # Check cache
-        if arxiv_id:
-            cache_key = f"metadata_{arxiv_id}"
-            cached_data = paper_analysis_cache.get(cache_key)
-            if cached_data:
-                return jsonify(cached_data)
+# Route for the metadata of many papers at once: cached entries first, the rest in chunked arXiv id_list queries
+@app.route('/get-paper-metadata-batch', methods=['POST'])
+def get_paper_metadata_batch():
+    paper_ids = (request.get_json(silent=True) or {}).get('paper_ids')
+    if not isinstance(paper_ids, list) or not all(isinstance(paper_id, str) for paper_id in paper_ids):
+        return jsonify({"error": "paper_ids must be a list of paper URLs"}), 400
+    if len(paper_ids) > MAX_METADATA_BATCH:
+        return jsonify({"error": f"At most {MAX_METADATA_BATCH} paper ids per request"}), 400
 
+    try:
+        arxiv_ids = {paper_id: arxiv_id_from_url(paper_id) for paper_id in paper_ids}
+        found, _ = get_arxiv_metadata([arxiv_id for arxiv_id in arxiv_ids.values() if arxiv_id])
+        # Papers outside arXiv, unknown to it, or whose lookup failed are null
+        return jsonify({"metadata": {paper_id: found.get(arxiv_id) for paper_id, arxiv_id in arxiv_ids.items()}})
+
+    except Exception as e:
+        print(f"Error getting paper metadata: {str(e)}")
         return jsonify({"error": f"Failed to get paper metadata: {str(e)}"}), 500
 
 
+# Return the publication and update dates of arXiv papers, from the metadata cache or arXiv, None if unknown,
+# and the ids whose lookup failed, also None and not cached
+def get_arxiv_metadata(arxiv_ids):
+    metadata = {}
+    missing = []
+    for arxiv_id in dict.fromkeys(arxiv_ids):
+        cached = metadata_cache.get(arxiv_id)
+        if cached is not None:
+            metadata[arxiv_id] = cached
+        elif ARXIV_ID_PATTERN.fullmatch(arxiv_id):
+            missing.append(arxiv_id)
+        else:
+            # A malformed id would make arXiv reject the whole id_list query
+            metadata[arxiv_id] = None
+
+    # One query per chunk, run on the arXiv pool and spaced by the shared rate limit
+    failed = set()
+    chunks = [missing[i:i + ARXIV_ID_LIST_SIZE] for i in range(0, len(missing), ARXIV_ID_LIST_SIZE)]
+    for chunk, future in [(chunk, arxiv_executor.submit(fetch_metadata_by_id, chunk)) for chunk in chunks]:
+        try:
+            metadata.update(future.result())
+        except Exception as e:
+            print(f"Error fetching arXiv metadata for {len(chunk)} papers: {str(e)}")
+            failed.update(chunk)
+        for arxiv_id in chunk:
+            metadata.setdefault(arxiv_id, None)
+    return metadata, failed
+
+
+# Fetch the dates of up to ARXIV_ID_LIST_SIZE papers with a single arXiv id_list query, and cache them
+def fetch_metadata_by_id(arxiv_ids):
+    import arxiv
+
+    # A page holds the whole id list, so the query is a single request. wait_for_arxiv_slot spaces the requests,
+    # so the client adds no delay of its own; it is not shared, as its request bookkeeping is not thread-safe
+    client = arxiv.Client(page_size=len(arxiv_ids), delay_seconds=0)
+    search = arxiv.Search(id_list=arxiv_ids, max_results=len(arxiv_ids))
+    wait_for_arxiv_slot()
+    metadata = {}
+    for paper in client.results(search):
+        arxiv_id = arxiv_id_from_url(paper.entry_id)
+        metadata[arxiv_id] = {
+            "publication_date": paper.published.strftime('%Y.%m.%d'),
+            "updated_date": paper.updated.strftime('%Y.%m.%d') if paper.updated else None
+        }
+        metadata_cache.set(arxiv_id, metadata[arxiv_id])
+    return metadata
+
+
 if __name__ == '__main__':
     app.run(debug=True)
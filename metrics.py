@@ -0,0 +1,52 @@
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+class Metrics:
+    '''
+    Thread-safe named series of samples (latencies, token counts) and counters.
+    Percentiles and max are computed over the most recent window samples of each series,
+    counts and totals over the whole lifetime.
+    '''
+
+    def __init__(self, window: int = 1000) -> None:
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(float)
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self._samples[name].append(value)
+            self._counts[name] += 1
+            self._totals[name] += value
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def summary(self) -> dict:
+        '''
+        Count, total, mean, p50, p95 and max of every series, and the value of every counter
+        '''
+        with self._lock:
+            samples = {name: np.array(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+
+        result = {}
+        for name, values in samples.items():
+            result[name] = {
+                "count": counts[name],
+                "total": totals[name],
+                "mean": totals[name] / counts[name],
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(values.max())
+            }
+        result.update(counters)
+        return result
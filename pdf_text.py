@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes extracting pages. A document is split into one contiguous range of pages per worker,
+# so each worker parses it once, but not into ranges shorter than PDF_MIN_PAGES_PER_WORKER
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MIN_PAGES_PER_WORKER = int(os.getenv("PDF_MIN_PAGES_PER_WORKER", "4"))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    '''
+    Return the process pool of this process, created again in a worker process forked from a preloaded app.
+    Workers are forked where possible: spawned ones would import the __main__ module of the server again,
+    with its vector store and model, while forked ones share its pages and only ever run PyPDF2.
+    '''
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+                _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                                mp_context=multiprocessing.get_context(method))
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class TemporaryPDF:
+    '''
+    A PDF file on disk, deleted when closed or garbage collected. Unlike a NamedTemporaryFile, it is not
+    held open, so the extraction workers can open it by name on Windows too.
+    '''
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._finalizer = weakref.finalize(self, _unlink, name)
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> 'TemporaryPDF':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def write_temporary(data: bytes) -> TemporaryPDF:
+    '''
+    Write PDF bytes into a new temporary file
+    '''
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        pdf_file = TemporaryPDF(f.name)
+        f.write(data)
+    return pdf_file
+
+
+async def download(client, url: str) -> TemporaryPDF:
+    '''
+    Stream a PDF into a temporary file on disk instead of buffering the whole response.
+    The extraction workers open it by name; it is deleted when closed.
+    '''
+    f = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    pdf_file = TemporaryPDF(f.name)
+    try:
+        with f:
+            async with client.stream('GET', url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+    except BaseException:
+        pdf_file.close()
+        raise
+    return pdf_file
+
+
+def extract_pages(path: str, start: int, stop: int) -> list[str]:
+    '''
+    Extract the text of pages start to stop - 1, run in a worker process
+    '''
+    from PyPDF2 import PdfReader
+
+    # An open file is read as needed, where a path would make PdfReader load the whole file
+    with open(path, 'rb') as f:
+        reader = PdfReader(f)
+        return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def iter_pages(path: str):
+    '''
+    Yield the text of every page of a PDF file in order, extracted in parallel across the process pool.
+    The first range of pages is extracted here and yielded page by page while the workers parse the others.
+    '''
+    from PyPDF2 import PdfReader
+
+    with open(path, 'rb') as f:
+        # Counting the pages only parses the cross-reference table and the page tree
+        reader = PdfReader(f)
+        pages = len(reader.pages)
+        workers = min(PDF_WORKERS, pages // PDF_MIN_PAGES_PER_WORKER)
+        if workers < 2:
+            # Not worth parsing the document in other processes, still yield page by page
+            for page in reader.pages:
+                yield page.extract_text()
+            return
+
+        size = -(-pages // workers)
+        executor = get_executor()
+        futures = [executor.submit(extract_pages, path, start, min(start + size, pages))
+                   for start in range(size, pages, size)]
+        try:
+            for i in range(size):
+                yield reader.pages[i].extract_text()
+            for future in futures:
+                yield from future.result()
+        finally:
+            # The client may disconnect from a streamed response, drop the ranges not started yet
+            for future in futures:
+                future.cancel()
+
+
+def join_pages(pages) -> str:
+    return "".join(text + "\n\n" for text in pages)
@@ -0,0 +1,600 @@
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows, where the store is used by a single process
+    fcntl = None
+
+INDEX_TYPES = ('flat', 'sq_fp16', 'sq8', 'pq', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# Files of a persisted store directory
+CONFIG_FILE = 'store.json'
+INDEX_FILE = 'index.faiss'
+VECTORS_FILE = 'vectors.f32'
+ARTICLES_FILE = 'articles.jsonl'
+LOCK_FILE = 'writer.lock'
+
+
+def create_index(index_type: str, dim: int, nlist: int = 1024, pq_m: int = 16, pq_bits: int = 8,
+                 hnsw_m: int = 32) -> faiss.Index:
+    '''
+    Build an empty FAISS index of the given type
+    ---------------------------------
+    index_type: one of INDEX_TYPES; sq_fp16, sq8 and pq are exhaustive like flat, but store every vector
+        as float16 (2 bytes per dimension), int8 (1 byte) or pq_m codes of pq_bits
+    nlist: number of inverted lists (IVF types)
+    pq_m, pq_bits: number of sub-quantizers and bits per code (pq, ivf_pq), dim must be divisible by pq_m
+    hnsw_m: number of graph neighbours per node (hnsw)
+    '''
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dim)
+    if index_type == 'sq_fp16':
+        return faiss.index_factory(dim, "SQfp16")
+    if index_type == 'sq8':
+        return faiss.index_factory(dim, "SQ8")
+    if index_type in ('pq', 'ivf_pq') and dim % pq_m != 0:
+        raise ValueError(f'Embedding dimension {dim} is not divisible by pq_m={pq_m}.')
+    if index_type == 'pq':
+        return faiss.index_factory(dim, f"PQ{pq_m}x{pq_bits}")
+    if index_type == 'ivf_flat':
+        return faiss.index_factory(dim, f"IVF{nlist},Flat")
+    if index_type == 'ivf_pq':
+        return faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m}x{pq_bits}")
+    if index_type == 'hnsw':
+        return faiss.index_factory(dim, f"HNSW{hnsw_m}")
+    raise ValueError(f'Unknown index type: {index_type}. Expected one of {", ".join(INDEX_TYPES)}.')
+
+
+def default_train_size(index_type: str, nlist: int = 1024, pq_bits: int = 8) -> int:
+    '''
+    Number of vectors collected before training: FAISS recommends at least 39 training points per centroid,
+    of the IVF lists or of each PQ codebook. sq8 only learns the range of every dimension.
+    '''
+    if index_type.startswith('ivf'):
+        return 39 * nlist
+    if index_type == 'pq':
+        return 39 * 2 ** pq_bits
+    return 1000
+
+
+def index_size(index: faiss.Index) -> int:
+    '''
+    Estimated bytes of an index from its row count and code size, without serializing it.
+    Trained codebooks, which do not grow with the rows, are left out.
+    '''
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        # The codes plus the 4-byte neighbour ids of the base layer, the upper layers are small next to it
+        return index_size(index.storage) + index.ntotal * 4 * index.hnsw.nb_neighbors(0)
+    if isinstance(index, faiss.IndexIVF):
+        # The inverted lists keep an 8-byte id with every code
+        return index.ntotal * (index.code_size + 8) + index_size(index.quantizer)
+    return index.ntotal * index.code_size
+
+
+def search_parameters(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    '''
+    Per-call search parameters, so tuning one request does not change the index for the others.
+    Return None when the index type has nothing to tune.
+    '''
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+
+def read_index_mmap(path: str, index_type: str) -> faiss.Index:
+    '''
+    Open an index file memory-mapped instead of copying it into RAM. The returned index is read-only.
+    IO_FLAG_MMAP maps IVF inverted lists, IO_FLAG_MMAP_IFC maps the codes of flat and HNSW storage.
+    '''
+    if index_type.startswith('ivf') or not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+
+
+class ReadWriteLock:
+    '''
+    Any number of readers or a single writer. Waiting writers go first,
+    so a steady stream of searches cannot starve ingestion.
+    '''
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class ArticleTable(Mapping):
+    '''
+    Article metadata by URL, one row per article in row id order. Every article is kept as compact JSON
+    in a single shared buffer, at an offset per row, and decoded into a new dict when it is read, instead of
+    staying a dict with its own key strings, which dominates memory at millions of papers.
+    Rows are only appended, under the write lock of the owning store.
+    '''
+
+    def __init__(self) -> None:
+        # URL of every row, and row id of every URL
+        self.urls = []
+        self._rows = {}
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self._url_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __iter__(self):
+        return iter(self.urls)
+
+    def __contains__(self, url) -> bool:
+        return url in self._rows
+
+    def __getitem__(self, url: str) -> dict:
+        return self.row(self._rows[url])
+
+    def row(self, i: int) -> dict:
+        '''
+        Return a copy of the article of row i
+        '''
+        return json.loads(self._data[self._offsets[i]:self._offsets[i + 1]])
+
+    def append(self, article: dict) -> None:
+        url = article['url']
+        self._rows[url] = len(self.urls)
+        self.urls.append(url)
+        self._data += json.dumps(article, ensure_ascii=False, separators=(',', ':')).encode()
+        self._offsets.append(len(self._data))
+        self._url_bytes += sys.getsizeof(url)
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        Bytes held by the table, from its containers and a running count of the URL strings
+        '''
+        return (sys.getsizeof(self._data) + sys.getsizeof(self._offsets) + sys.getsizeof(self._rows)
+                + sys.getsizeof(self.urls) + self._url_bytes)
+
+
+class VectorStore:
+    '''
+    Article embeddings in a FAISS index plus the metadata of every row, kept as compact JSON in an ArticleTable.
+
+    Rows that are not in the index yet live in an exact flat buffer and are searched together with it:
+    IVF indexes collect train_size vectors there before training, and a memory-mapped index, which is
+    read-only, collects the rows added since the last snapshot.
+
+    The compressed index types (sq_fp16, sq8, pq, ivf_pq) compute distances on the fly from their codes.
+    With rerank_factor, a persisted store instead fetches rerank_factor * k candidates from the index and
+    orders them by their exact float32 distance, reading those vectors from the memory-mapped vector log,
+    so only the codes need to stay in RAM. memory_usage() reports the bytes held per paper.
+
+    With a path, the store is persisted in that directory: every add appends to a raw float32 vector
+    log and a JSON Lines metadata file, and the index is snapshotted with faiss.write_index once
+    snapshot_every rows were added since the last snapshot. On startup the snapshot is opened memory-mapped and only
+    the log tail after it is replayed into the buffer. An existing store keeps its own index type.
+
+    The store is safe to share between threads. Writers are serialized, and the slow parts of a write
+    (log appends, training, snapshots) run while searches continue on the previous state. Searches only
+    wait while new rows are published together with their metadata, so a row id always maps to its article.
+
+    A persisted store can also be shared by several processes, such as the workers of one server.
+    Writes hold an exclusive lock file on the directory and first catch up with the logs, so the logs
+    have a single writer at a time and every process sees the same rows under the same row ids.
+    Searches pick up rows and snapshots written by other processes at most refresh_interval seconds late;
+    snapshots are memory-mapped, so their pages are shared by all processes.
+    '''
+
+    def __init__(self, dim: int, index_type: str = 'flat', train_size: int = None, nlist: int = 1024,
+                 pq_m: int = 16, pq_bits: int = 8, hnsw_m: int = 32, path: str = None,
+                 snapshot_every: int = 10000, refresh_interval: float = 1.0, rerank_factor: int = None) -> None:
+        if rerank_factor and path is None:
+            raise ValueError('rerank_factor needs a persisted store, whose vector log holds the exact vectors.')
+        self.dim = dim
+        self.index_type = index_type
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.refresh_interval = refresh_interval
+        self.rerank_factor = rerank_factor
+        self.buffer = faiss.IndexFlatL2(dim)
+        self.read_only = False
+        # Number of rows covered by the last index snapshot
+        self.snapshot_rows = 0
+        # Article metadata keyed by URL, with the URL of every row in articles.urls
+        self.articles = ArticleTable()
+        # Readers share _lock while writers publish under it; _write_lock serializes the writers
+        self._lock = ReadWriteLock()
+        self._write_lock = threading.Lock()
+        # Position in the logs up to which rows are loaded, and identity of the loaded snapshot file
+        self._articles_offset = 0
+        self._snapshot_id = None
+        self._next_refresh = 0.0
+        # Memory map of the vector log, for reranking
+        self._log_map = None
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load_config()
+        self.train_size = train_size or default_train_size(self.index_type, nlist=nlist, pq_bits=pq_bits)
+        self.index = create_index(self.index_type, dim, nlist=nlist, pq_m=pq_m, pq_bits=pq_bits, hnsw_m=hnsw_m)
+        if path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.articles
+
+    @property
+    def is_trained(self) -> bool:
+        return self.index.is_trained
+
+    def add(self, articles: list[dict], embeddings: np.ndarray) -> int:
+        '''
+        Append articles and their embeddings, one row per article in the given order.
+        Articles whose URL is already stored, by this or a concurrent call, are skipped.
+        Return the number of rows added.
+        '''
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(articles) != len(embeddings):
+            raise ValueError('Number of articles and embeddings must match.')
+
+        with self._write_lock, self._process_lock():
+            self._refresh(truncate=True)
+            rows = {}
+            for i, article in enumerate(articles):
+                if article['url'] not in self.articles and article['url'] not in rows:
+                    rows[article['url']] = i
+            if not rows:
+                return 0
+            articles = [articles[i] for i in rows.values()]
+            embeddings = embeddings[list(rows.values())]
+
+            if self.path is not None:
+                self._append_log(articles, embeddings)
+            self._publish(articles, embeddings)
+
+            if not self.is_trained:
+                if self.buffer.ntotal >= self.train_size:
+                    self._train()
+            if self.path is not None and len(self) - self.snapshot_rows >= self.snapshot_every:
+                self._save()
+            return len(articles)
+
+    def train(self) -> None:
+        '''
+        Train the index on the buffered vectors and move them into it, keeping row ids unchanged
+        '''
+        with self._write_lock, self._process_lock():
+            self._refresh(truncate=True)
+            self._train()
+
+    def save(self) -> None:
+        '''
+        Snapshot the index, including the buffered rows, and reopen it memory-mapped.
+        Untrained indexes are not snapshotted: their rows are replayed from the vector log instead.
+        '''
+        with self._write_lock, self._process_lock():
+            self._refresh(truncate=True)
+            self._save()
+
+    def refresh(self) -> int:
+        '''
+        Load the rows and the latest snapshot written by other processes sharing the store directory.
+        Searches call this at most every refresh_interval seconds. Return the number of new rows.
+        '''
+        if self.path is None:
+            return 0
+        with self._write_lock:
+            return self._refresh()
+
+    def search_vectors(self, vectors: np.ndarray, k: int, nprobe: int = None, ef_search: int = None):
+        '''
+        Raw FAISS search, return (distances, row ids) with -1 padding for missing hits
+        '''
+        self._maybe_refresh()
+        with self._lock.read():
+            return self._search_vectors(vectors, k, nprobe, ef_search)
+
+    def search(self, vector: np.ndarray, k: int = 5, nprobe: int = None, ef_search: int = None) -> list[dict]:
+        '''
+        Return copies of the k nearest articles, each with its L2 distance
+        '''
+        self._maybe_refresh()
+        with self._lock.read():
+            distances, indices = self._search_vectors(vector, k, nprobe, ef_search)
+            results = []
+            for distance, i in zip(distances[0], indices[0]):
+                if i >= 0:
+                    article = self.articles.row(i)
+                    article['distance'] = float(distance)
+                    results.append(article)
+            return results
+
+    def memory_usage(self) -> dict:
+        '''
+        Bytes held by the index, the exact buffer and the article metadata, in total and per paper.
+        A memory-mapped index counts with its file size; its pages are shared between processes and can be
+        evicted. The vector log is on disk and only read for reranking. Sizes are estimated from counters,
+        so this is cheap enough for a metrics endpoint and does not hold up searches.
+        '''
+        with self._lock.read():
+            if self.read_only:
+                index_bytes = os.path.getsize(self._file(INDEX_FILE))
+            else:
+                index_bytes = index_size(self.index)
+            usage = {
+                "index_type": self.index_type,
+                "rows": len(self.articles),
+                "index": index_bytes,
+                "buffer": self.buffer.ntotal * self.dim * 4,
+                "metadata": self.articles.nbytes
+            }
+        if self.path is not None:
+            usage["vector_log"] = os.path.getsize(self._file(VECTORS_FILE))
+        usage["total"] = usage["index"] + usage["buffer"] + usage["metadata"]
+        rows = max(usage["rows"], 1)
+        usage["bytes_per_paper"] = {name: usage[name] / rows for name in ("index", "buffer", "metadata", "total")}
+        return usage
+
+    # Writers below hold _write_lock, and the process lock when they write files, so the buffer and the index
+    # only change under it; a new index is built next to the live one, then swapped in under the write side of _lock
+
+    def _publish(self, articles, vectors, index=None) -> None:
+        # Make rows visible to searches together with their metadata, optionally on top of a newer snapshot
+        with self._lock.write():
+            for article in articles:
+                self.articles.append(article)
+            if index is not None:
+                self.index = index
+                self.read_only = True
+                self.buffer.reset()
+            if len(vectors):
+                self.buffer.add(vectors)
+            if self.is_trained and not self.read_only:
+                self._merge_buffer()
+
+    def _refresh(self, truncate: bool = False) -> int:
+        '''
+        Load the complete rows appended to the logs after the loaded ones, and a newer snapshot.
+        Other processes may be appending; with truncate, the caller holds the process lock, so an
+        incomplete tail can only be left by an interrupted append and is cut from both logs.
+        '''
+        if self.path is None:
+            return 0
+        row_bytes = 4 * self.dim
+        vector_rows = os.path.getsize(self._file(VECTORS_FILE)) // row_bytes
+        # Vectors are written first, so a row is complete once its metadata line is
+        articles = []
+        valid_bytes = 0
+        with open(self._file(ARTICLES_FILE), 'rb') as f:
+            f.seek(self._articles_offset)
+            for line in f:
+                if len(self.articles) + len(articles) == vector_rows or not line.endswith(b'\n'):
+                    break
+                articles.append(json.loads(line))
+                valid_bytes += len(line)
+        rows = len(self.articles) + len(articles)
+        if truncate:
+            with open(self._file(ARTICLES_FILE), 'r+b') as f:
+                f.truncate(self._articles_offset + valid_bytes)
+            with open(self._file(VECTORS_FILE), 'r+b') as f:
+                f.truncate(rows * row_bytes)
+
+        index = None
+        snapshot_id = self._stat_snapshot()
+        if snapshot_id is not None and snapshot_id != self._snapshot_id:
+            index = read_index_mmap(self._file(INDEX_FILE), self.index_type)
+            if index.ntotal > rows:
+                if truncate:
+                    raise ValueError(f'Vector store at {self.path} has a snapshot newer than its vector log.')
+                # Written after the logs were read, pick it up with its rows on the next refresh
+                index = None
+            else:
+                self._snapshot_id = snapshot_id
+
+        # The buffer holds the rows after the index
+        start = index.ntotal if index is not None else len(self.articles)
+        vectors = np.empty((0, self.dim), dtype=np.float32)
+        if rows > start:
+            log = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r', shape=(rows, self.dim))
+            vectors = np.ascontiguousarray(log[start:])
+            del log
+        if articles or index is not None:
+            self._publish(articles, vectors, index)
+        self._articles_offset += valid_bytes
+        if index is not None:
+            self.snapshot_rows = index.ntotal
+        return len(articles)
+
+    def _maybe_refresh(self) -> None:
+        if self.path is None or self.refresh_interval is None or time.monotonic() < self._next_refresh:
+            return
+        self._next_refresh = time.monotonic() + self.refresh_interval
+        # Never wait for a writer, which catches up with the logs itself
+        if self._write_lock.acquire(blocking=False):
+            try:
+                self._refresh()
+            finally:
+                self._write_lock.release()
+
+    @contextmanager
+    def _process_lock(self):
+        # Exclusive across the processes sharing the store directory, held while writing its files
+        if self.path is None or fcntl is None:
+            yield
+            return
+        with open(self._file(LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stat_snapshot(self):
+        try:
+            stat = os.stat(self._file(INDEX_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _train(self) -> None:
+        if self.is_trained or self.buffer.ntotal == 0:
+            return
+        vectors = self.buffer.reconstruct_n(0, self.buffer.ntotal)
+        index = faiss.clone_index(self.index)
+        index.train(vectors)
+        index.add(vectors)
+        with self._lock.write():
+            self.index = index
+            self.buffer.reset()
+        if self.path is not None:
+            self._save()
+
+    def _save(self) -> None:
+        if self.path is None or not self.is_trained:
+            return
+        if self.read_only:
+            # The mapped index cannot grow, so extend a private in-memory copy of the last snapshot
+            index = faiss.read_index(self._file(INDEX_FILE))
+            if self.buffer.ntotal > 0:
+                index.add(self.buffer.reconstruct_n(0, self.buffer.ntotal))
+        else:
+            # A trained in-memory index already holds every row
+            index = self.index
+        tmp_path = self._file(INDEX_FILE + '.tmp')
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self._file(INDEX_FILE))
+        self._snapshot_id = self._stat_snapshot()
+        mapped = read_index_mmap(self._file(INDEX_FILE), self.index_type)
+        with self._lock.write():
+            self.index = mapped
+            self.buffer.reset()
+            self.read_only = True
+        self.snapshot_rows = mapped.ntotal
+
+    def _search_vectors(self, vectors, k, nprobe, ef_search):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not self.rerank_factor:
+            return self._search_merged(vectors, k, nprobe, ef_search)
+        distances, indices = self._search_merged(vectors, k * self.rerank_factor, nprobe, ef_search)
+        if not (indices >= 0).any():
+            # Nothing to rerank, and the log of an empty store cannot be mapped
+            return distances[:, :k], indices[:, :k]
+        return self._rerank(vectors, indices, k)
+
+    def _rerank(self, vectors, indices, k):
+        # Exact distances of the candidates from the float32 vectors of the log, which holds every published row
+        rows = len(self.articles)
+        if self._log_map is None or len(self._log_map) < rows:
+            self._log_map = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r', shape=(rows, self.dim))
+        candidates = self._log_map[np.where(indices >= 0, indices, 0)]
+        distances = ((candidates - vectors[:, None, :]) ** 2).sum(axis=2, dtype=np.float32)
+        distances[indices < 0] = np.inf
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _search_merged(self, vectors, k, nprobe, ef_search):
+        if self.buffer.ntotal == 0:
+            return self._search_index(vectors, k, nprobe, ef_search)
+        distances, indices = self.buffer.search(vectors, k)
+        indices = np.where(indices >= 0, indices + self.index.ntotal, -1)
+        if self.index.ntotal == 0:
+            return distances, indices
+
+        # Merge the hits of the index and the buffer by distance
+        index_distances, index_indices = self._search_index(vectors, k, nprobe, ef_search)
+        distances = np.hstack([index_distances, distances])
+        indices = np.hstack([index_indices, indices])
+        distances[indices < 0] = np.inf
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _search_index(self, vectors, k, nprobe, ef_search):
+        if self.index.ntotal == 0:
+            return np.full((len(vectors), k), np.inf, dtype=np.float32), np.full((len(vectors), k), -1)
+        params = search_parameters(self.index, nprobe=nprobe, ef_search=ef_search)
+        if params is None:
+            return self.index.search(vectors, k)
+        return self.index.search(vectors, k, params=params)
+
+    def _merge_buffer(self) -> None:
+        if self.buffer.ntotal > 0:
+            self.index.add(self.buffer.reconstruct_n(0, self.buffer.ntotal))
+            self.buffer.reset()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load_config(self) -> None:
+        config_path = self._file(CONFIG_FILE)
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+            if config['dim'] != self.dim:
+                raise ValueError(f"Vector store at {self.path} has dimension {config['dim']}, expected {self.dim}.")
+            self.index_type = config['index_type']
+        else:
+            with open(config_path, 'w') as f:
+                json.dump({'dim': self.dim, 'index_type': self.index_type}, f)
+
+    def _load(self) -> None:
+        open(self._file(VECTORS_FILE), 'ab').close()
+        open(self._file(ARTICLES_FILE), 'ab').close()
+        # Only the log tail after the snapshot is replayed into the buffer
+        with self._write_lock, self._process_lock():
+            self._refresh(truncate=True)
+            if not self.is_trained and self.buffer.ntotal >= self.train_size:
+                self._train()
+
+    def _append_log(self, articles: list[dict], embeddings: np.ndarray) -> None:
+        # Vectors first, so a row with metadata always has its vector
+        with open(self._file(VECTORS_FILE), 'ab') as f:
+            f.write(embeddings.tobytes())
+        data = ''.join(json.dumps(article) + '\n' for article in articles).encode()
+        with open(self._file(ARTICLES_FILE), 'ab') as f:
+            f.write(data)
+        self._articles_offset += len(data)